@@ -1,6 +1,10 @@
 import pytest
+from django.core.cache import caches
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
+from myApp import cocktaildb, indexes
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
 from myApp.models import Category, Ingredient, Recipe, RecipeIngredient
 
 
@@ -9,6 +13,45 @@ def api_client():
     return APIClient()
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache(settings, tmp_path):
+    # The shared cache file and the in-process tier outlive the per-test
+    # rollback, give every test an empty cache
+    settings.CACHES = {
+        **settings.CACHES,
+        "shared": {
+            "BACKEND": "myApp.cache_backends.SQLiteCache",
+            "LOCATION": str(tmp_path / "cache.sqlite3"),
+        },
+    }
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if hasattr(backend, "clear_local"):
+            backend.clear_local()
+
+
+@pytest.fixture(autouse=True)
+def eager_tasks(settings):
+    # Enqueued jobs run inline, as if a worker picked them up at once
+    settings.TASKS = {**settings.TASKS, "EAGER": True}
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    # The in-process catalog indexes would keep the recipes of other tests
+    for index in indexes.registry:
+        index.reset()
+
+
+@pytest.fixture
+def cocktaildb_client():
+    # Views talk to an in-memory TheCocktailDB instead of the network
+    client = cocktaildb.LocalCocktailDBClient(drinks=[])
+    cocktaildb.set_client(client)
+    yield client
+    cocktaildb.set_client(None)
+
+
 @pytest.fixture
 def user(db):
     return User.objects.create_user(username="testuser", password="password")
@@ -38,3 +81,29 @@ def recipe(db, category, ingredient):
         recipe=recipe, ingredient=ingredient, amount="1 oz", order=1
     )
     return recipe
+
+
+@pytest.fixture
+def make_drink():
+    """Build a Drink, each ingredient measured "1 oz"."""
+
+    def make_drink(drink_id, title, ingredients=("Gin",), **fields):
+        fields = {"category": "Cocktail", "instructions": "Stir.", **fields}
+        return Drink(
+            id=drink_id,
+            title=title,
+            ingredients=tuple((name, "1 oz") for name in ingredients),
+            **fields,
+        )
+
+    return make_drink
+
+
+@pytest.fixture
+def write_drinks(db):
+    """Write drinks to the catalog, return {recipe_id: Recipe pk}."""
+
+    def write_drinks(*drinks):
+        return CatalogWriter().write(drinks)
+
+    return write_drinks
@@ -180,15 +180,58 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "user": "20/minute",
         "anon": "20/minute",
+        # Hit on every keystroke
+        "typeahead": "600/minute",
+        # Full catalog dumps
+        "export": "10/hour",
     },
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
-    "PAGE_SIZE": 2,
+    # RecipeViewset uses myApp.pagination.RecipePagination, where clients
+    # pick the page size up to 100
+    "PAGE_SIZE": 20,
 }
 
 
 CACHES = {
+    # Per-worker LRU in front of the shared cache, see myApp/cache_backends.py
     "default": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "my_cache_table",
-    }
+        "BACKEND": "myApp.cache_backends.TieredCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+            "MAX_BYTES": 16 * 1024 * 1024,
+            "L1_TIMEOUT": 30,
+            # Catalog and favorites version tokens must be seen by all
+            # workers right away
+            "BYPASS_PREFIXES": ("throttle_", "catalog:", "version:"),
+        },
+    },
+    # One SQLite file shared by the gunicorn workers of the host, run
+    # `python manage.py cache_stats` to inspect it
+    "shared": {
+        "BACKEND": "myApp.cache_backends.SQLiteCache",
+        "LOCATION": config("CACHE_PATH", default=str(BASE_DIR / "cache.sqlite3")),
+        "OPTIONS": {
+            "MAX_BYTES": config("CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int),
+        },
+    },
+}
+
+
+# TheCocktailDB client, see myApp/cocktaildb.py for all options
+COCKTAILDB = {
+    "BASE_URL": config(
+        "COCKTAILDB_BASE_URL", default="https://www.thecocktaildb.com/api/json/v1/1/"
+    ),
+    "CLIENT": config("COCKTAILDB_CLIENT", default="myApp.cocktaildb.CocktailDBClient"),
+    "CONNECT_TIMEOUT": config("COCKTAILDB_CONNECT_TIMEOUT", default=3.05, cast=float),
+    "READ_TIMEOUT": config("COCKTAILDB_READ_TIMEOUT", default=5, cast=float),
+    "RETRIES": config("COCKTAILDB_RETRIES", default=2, cast=int),
+    "FIXTURES": config("COCKTAILDB_FIXTURES", default=None),
+}
+
+# Deferred jobs, see myApp/tasks.py. Run them with `python manage.py run_tasks`
+TASKS = {
+    "EAGER": config("TASKS_EAGER", default=False, cast=bool),
+    "WORKERS": config("TASKS_WORKERS", default=4, cast=int),
 }
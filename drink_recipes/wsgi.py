@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drink_recipes.settings")
 
 application = get_wsgi_application()
+
+# Build the in-process catalog indexes before the worker takes requests
+from myApp.indexes import warm_up  # noqa: E402
+
+warm_up()
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import Category, Rating, Recipe, Ingredient, Favorite, RecipeIngredient
+from .models import (
+    Category,
+    Favorite,
+    Ingredient,
+    Job,
+    Rating,
+    Recipe,
+    RecipeIngredient,
+)
 
 
 admin.site.register(RecipeIngredient)
@@ -8,3 +16,4 @@ admin.site.register(Rating)
 admin.site.register(Recipe)
 admin.site.register(Ingredient)
 admin.site.register(Favorite)
+admin.site.register(Job)
@@ -9,5 +9,16 @@ router = DefaultRouter()
 router.register(r"recipes", api_views.RecipeViewset, basename="recipes")
 
 urlpatterns = [
+    path("status/", api_views.UpstreamStatusView.as_view(), name="status"),
+    path("makeable/", api_views.MakeableView.as_view(), name="makeable"),
+    path("typeahead/", api_views.TypeaheadView.as_view(), name="typeahead"),
+    path(
+        "recommendations/",
+        api_views.RecommendationsView.as_view(),
+        name="recommendations",
+    ),
+    path(
+        "export/<slug:kind>.<slug:fmt>", api_views.ExportView.as_view(), name="export"
+    ),
     path("", include(router.urls)),
 ]
@@ -1,39 +1,364 @@
+from django.core.cache import cache
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 
-from .models import Recipe, Favorite
-from .serializers import RecipeSerializer, FavoriteSerializer
+from . import caching, export, facets, fragments, pantry, recommend, typeahead
+from .cocktaildb import get_client
+from .filters import MAX_ID, FacetFilter, LocalSearchFilter
+from .ingest import add_favorite, update_favorites
+from .models import Recipe, Favorite, Rating
+from .pagination import RatingPagination, RecipePagination
+from .serializers import (
+    BATCH_LIMIT,
+    FavoriteBatchSerializer,
+    FavoriteSerializer,
+    RatingSerializer,
+    RecipeListSerializer,
+    RecipeSerializer,
+)
+from .signals import catalog_state
+from .versions import conditional, favorites_version, latest, respond
 
-from rest_framework import filters, viewsets, status
+from rest_framework import permissions, viewsets, status
+from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+
+
+def recipe_versions(request, pk):
+    try:
+        updated_at = (
+            Recipe.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        )
+    except ValueError:
+        updated_at = None
+    if updated_at is None:
+        # Answered with a 404 by the view
+        return None
+    # is_my_favorite depends on the user's favorites, similar_drinks on the
+    # other recipes
+    favorites = favorites_version(request.user.pk)
+    return [updated_at, favorites, catalog_state()], latest(updated_at, favorites)
 
 
 class RecipeViewset(viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by("id")
     serializer_class = RecipeSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [LocalSearchFilter, FacetFilter]
+    # Also handles ?ordering=
+    pagination_class = RecipePagination
+    # Searched through myApp/search.py, listed for the browsable API
     search_fields = ["title", "ingredients__name"]
 
     # TODO: Users can filter like this:
     # http://127.0.0.1:8000/api/v1/recipes/?search=Sprite
 
+    def get_queryset(self):
+        # Ingredients are only loaded by the serializer when its cached
+        # fragment is missing
+        return super().get_queryset().select_related("category")
+
+    def get_serializer_class(self):
+        if self.action in ("list", "also_liked"):
+            return RecipeListSerializer
+        if self.action == "ratings":
+            return RatingSerializer
+        return RecipeSerializer
+
+    def list(self, request, *args, **kwargs):
+        # The page is fetched first, its rows' versions make the ETag and a
+        # 304 skips the serializer
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        favorites = favorites_version(request.user.pk)
+        versions = [
+            self.paginator.count,
+            self.paginator.next_cursor,
+            favorites,
+            *((recipe.pk, recipe.updated_at) for recipe in page),
+        ]
+        return respond(
+            request,
+            versions,
+            latest(favorites, *(recipe.updated_at for recipe in page)),
+            lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ),
+        )
+
+    @method_decorator(conditional(recipe_versions))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=True)
+    def ratings(self, request, pk):
+        get_object_or_404(Recipe.objects.only("pk"), pk=pk)
+        ratings = (
+            Rating.objects.filter(recipe_id=pk)
+            .select_related("user")
+            .order_by("-date", "-id")
+        )
+        paginator = RatingPagination()
+        page = paginator.paginate_queryset(ratings, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, url_path="also-liked")
+    def also_liked(self, request, pk):
+        """Recipes liked by the users who liked this one, see
+        myApp/recommend.py."""
+        get_object_or_404(Recipe.objects.only("pk"), pk=pk)
+        limit = int_param(request, "limit", 10, recommend.TOP_K)
+        scored = recommend.similar_recipes(pk, limit)
+        return Response({"results": scored_cards(request, scored)})
+
+    @action(detail=False, url_path="facets", url_name="facets")
+    def facet_counts(self, request):
+        """Counts per category, top ingredient and rating range of the
+        recipes matching the search and filters of the request."""
+        search_pks = LocalSearchFilter().get_search_pks(request)
+        facet_filter = FacetFilter()
+        filters = facet_filter.get_filters(request)
+        recipes = Recipe.objects.all()
+        if search_pks is not None:
+            recipes = recipes.filter(pk__in=search_pks)
+        return Response(
+            facets.cached_facets(recipes, search_pks, filters, facet_filter)
+        )
+
+    @action(detail=False)
+    def batch(self, request):
+        """The recipes of `?ids=`, in that order, in one round trip."""
+        ids = id_list_param(request, "ids", BATCH_LIMIT)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response(
+            {
+                "results": serializer.data,
+                "missing": [pk for pk in ids if pk not in recipes],
+            }
+        )
+
+    @action(detail=False, methods=["post"], url_path="favorites")
+    def batch_favorite(self, request):
+        """Add the recipes of `add` to the user's favorites and remove those
+        of `remove`, in one transaction, with a status per recipe."""
+        if not request.user.is_authenticated:
+            return not_authenticated()
+        serializer = FavoriteBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = serializer.validated_data["add"]
+        remove = serializer.validated_data["remove"]
+
+        statuses = update_favorites(request.user, add, remove)
+        return Response(
+            {
+                "add": [{"id": pk, "status": statuses["add"][pk]} for pk in add],
+                "remove": [
+                    {"id": pk, "status": statuses["remove"][pk]} for pk in remove
+                ],
+            }
+        )
+
     @action(detail=True, methods=["post"])
     def favorite(self, request, pk):
         if not request.user.is_authenticated:
-            return Response(
-                {"Auth": "You must be logged in to perform this action."},
-                status=status.HTTP_401_UNAUTHORIZED,
-            )
+            return not_authenticated()
 
         recipe = get_object_or_404(Recipe, pk=pk)
-        fav = Favorite.objects.filter(user=request.user, recipe=recipe)
-        if fav.exists():
-            fav.delete()
+        deleted, _ = Favorite.objects.filter(user=request.user, recipe=recipe).delete()
+        if deleted:
             return Response(
                 {"Unfavorite": "The recipe has been deleted from your favorite list."},
                 status=status.HTTP_200_OK,
             )
 
-        new_fav = Favorite.objects.create(user=request.user, recipe=recipe)
+        new_fav, _ = add_favorite(request.user, recipe.pk)
         serializer = FavoriteSerializer(new_fav)
         return Response({"Favorite": serializer.data}, status=status.HTTP_201_CREATED)
+
+
+def scored_cards(request, scored):
+    """Recipe cards of [(recipe pk, score)], in that order, with the score."""
+    recipes = Recipe.objects.select_related("category").in_bulk(
+        [recipe_pk for recipe_pk, _ in scored]
+    )
+    ranked = [(recipes[pk], score) for pk, score in scored if pk in recipes]
+    cards = RecipeListSerializer(
+        [recipe for recipe, _ in ranked],
+        many=True,
+        context={"request": request},
+    ).data
+    return [
+        {**card, "score": round(score, 4)} for card, (_, score) in zip(cards, ranked)
+    ]
+
+
+def not_authenticated():
+    return Response(
+        {"Auth": "You must be logged in to perform this action."},
+        status=status.HTTP_401_UNAUTHORIZED,
+    )
+
+
+def id_list_param(request, name, maximum):
+    """The distinct comma-separated ids of `name`, in their order."""
+    try:
+        ids = [
+            int(value)
+            for value in request.query_params.get(name, "").split(",")
+            if value.strip()
+        ]
+    except ValueError:
+        raise ValidationError({name: "Must be comma-separated integers."})
+    ids = list(dict.fromkeys(ids))
+    if not 0 < len(ids) <= maximum:
+        raise ValidationError({name: f"Between 1 and {maximum} ids."})
+    if not all(0 < pk <= MAX_ID for pk in ids):
+        raise ValidationError({name: f"Ids must be between 1 and {MAX_ID}."})
+    return ids
+
+
+def int_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+    if not 0 <= value <= maximum:
+        raise ValidationError({name: f"Must be between 0 and {maximum}."})
+    return value
+
+
+class TypeaheadView(APIView):
+    """Completions of `?q=` among recipe titles and ingredient names, at most
+    `?limit=` (default 8) of each."""
+
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "typeahead"
+
+    def get(self, request):
+        limit = int_param(request, "limit", 8, typeahead.MAX_LIMIT)
+        completions = typeahead.index.complete(request.query_params.get("q", ""), limit)
+        return Response(
+            {
+                "recipes": [
+                    {"id": pk, "title": title} for pk, title in completions["recipes"]
+                ],
+                "ingredients": [
+                    {"id": pk, "name": name} for pk, name in completions["ingredients"]
+                ],
+            }
+        )
+
+
+class MakeableView(APIView):
+    """Recipes that can be made with the comma-separated `?ingredients=`,
+    missing at most `?missing=` (default 0) other ingredients, ranked by the
+    share of their ingredients owned."""
+
+    MAX_MISSING = 5
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        missing = int_param(request, "missing", 0, self.MAX_MISSING)
+        limit = int_param(request, "limit", 20, self.MAX_LIMIT)
+        names = request.query_params.get("ingredients", "").split(",")
+        owned, unknown = pantry.index.resolve(n for n in names if n.strip())
+
+        count, matches = pantry.index.makeable(owned, missing, limit)
+        recipes = Recipe.objects.only("title", "picture_url").in_bulk(
+            [recipe_pk for recipe_pk, _, _ in matches]
+        )
+        results = []
+        for recipe_pk, ingredient_ids, missing_ids in matches:
+            recipe = recipes.get(recipe_pk)
+            if recipe is None:
+                continue
+            results.append(
+                {
+                    "id": recipe_pk,
+                    "title": recipe.title,
+                    "picture_url": recipe.picture_url,
+                    "coverage": round(1 - len(missing_ids) / len(ingredient_ids), 2),
+                    "missing": [pantry.index.ingredient_name(pk) for pk in missing_ids],
+                }
+            )
+        return Response(
+            {
+                "ingredients": [{"id": pk, "name": name} for pk, name in owned.items()],
+                "unknown": unknown,
+                "count": count,
+                "results": results,
+            }
+        )
+
+
+class RecommendationsView(APIView):
+    """Recipes like the ones the user favorited or rated well, at most
+    `?limit=` (default 20)."""
+
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return not_authenticated()
+        limit = int_param(request, "limit", 20, self.MAX_LIMIT)
+        scored = recommend.recommend_for_user(request.user, limit)
+        return Response({"results": scored_cards(request, scored)})
+
+
+class ExportView(APIView):
+    """The catalog (`recipes`) or the user's favorites (`favorites`) as
+    NDJSON or CSV, streamed as the rows are read."""
+
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "export"
+
+    def get(self, request, kind, fmt):
+        if fmt not in export.CONTENT_TYPES:
+            raise Http404
+        if kind == "recipes":
+            recipes, fields = export.catalog(), export.FIELDS
+        elif kind == "favorites":
+            if not request.user.is_authenticated:
+                return not_authenticated()
+            recipes, fields = export.favorites(request.user), export.FAVORITE_FIELDS
+        else:
+            raise Http404
+        response = StreamingHttpResponse(
+            export.export_lines(recipes, fmt, fields),
+            content_type=export.CONTENT_TYPES[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
+
+class UpstreamStatusView(APIView):
+    """TheCocktailDB breaker, call metrics and cache serving counters.
+
+    The numbers are those of the worker process answering the request.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        client = get_client()
+        return Response(
+            {
+                "cocktaildb": {
+                    "breaker": client.breaker.snapshot(),
+                    "calls": client.metrics.snapshot(),
+                },
+                "cache": caching.stats.snapshot(),
+                "fragments": fragments.stats.snapshot(),
+                "cache_backend": (
+                    cache.get_stats() if hasattr(cache, "get_stats") else None
+                ),
+            }
+        )
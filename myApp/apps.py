@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "myApp"
+
+    def ready(self):
+        # Register the signal receivers and the catalog indexes
+        from . import pantry, search, signals, typeahead  # noqa: F401
@@ -0,0 +1,535 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+
+class _LocalStore:
+    """L1 state, shared by the per-thread instances of a TieredCache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (pickled value, expires at)
+        self.bytes = 0
+        self.generation = None
+        self.checked_at = None
+        self.stats = dict.fromkeys(
+            ("hits", "misses", "evictions", "expirations", "invalidations"), 0
+        )
+
+
+# Like LocMemCache, one store per LOCATION for the whole process
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """A bounded per-process LRU (L1) in front of a shared cache (L2).
+
+    LOCATION is the alias of the shared cache in settings.CACHES. Writes go
+    through to L2 and L1 entries live at most L1_TIMEOUT seconds, so workers
+    never serve another worker's outdated value for longer than that.
+    Deletes and clears bump a generation token stored in L2 which every
+    worker checks at most once per SYNC_INTERVAL seconds and drops its whole
+    L1 when it changed.
+
+    Keys starting with one of BYPASS_PREFIXES or ending with one of
+    BYPASS_SUFFIXES (throttling histories, locks) always go to L2.
+
+    OPTIONS: MAX_ENTRIES, MAX_BYTES, L1_TIMEOUT, SYNC_INTERVAL,
+    BYPASS_PREFIXES, BYPASS_SUFFIXES.
+    """
+
+    GENERATION_KEY = "tiered_cache:generation"
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = location
+        self._max_bytes = options.get("MAX_BYTES", 8 * 1024 * 1024)
+        self._l1_timeout = options.get("L1_TIMEOUT", 30)
+        self._sync_interval = options.get("SYNC_INTERVAL", 1)
+        self._bypass_prefixes = tuple(options.get("BYPASS_PREFIXES", ("throttle_",)))
+        self._bypass_suffixes = tuple(options.get("BYPASS_SUFFIXES", (":lock",)))
+        with _stores_lock:
+            self._local = _stores.setdefault(location, _LocalStore())
+        self._lock = self._local.lock
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _bypass(self, key):
+        return key.startswith(self._bypass_prefixes) or key.endswith(
+            self._bypass_suffixes
+        )
+
+    # L1 bookkeeping, callers hold self._lock
+
+    def _drop(self, key):
+        entry = self._local.entries.pop(key, None)
+        if entry is not None:
+            self._local.bytes -= len(entry[0])
+
+    def _store(self, key, value, timeout):
+        if timeout is not None and timeout <= 0:
+            self._drop(key)
+            return
+        timeout = self._l1_timeout if timeout is None else timeout
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._drop(key)
+        if len(data) > self._max_bytes:
+            return
+        expires = time.monotonic() + min(timeout, self._l1_timeout)
+        self._local.entries[key] = (data, expires)
+        self._local.bytes += len(data)
+        while (
+            len(self._local.entries) > self._max_entries
+            or self._local.bytes > self._max_bytes
+        ):
+            _, (data, _) = self._local.entries.popitem(last=False)
+            self._local.bytes -= len(data)
+            self._local.stats["evictions"] += 1
+
+    def _lookup(self, key):
+        entry = self._local.entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] <= time.monotonic():
+            self._drop(key)
+            self._local.stats["expirations"] += 1
+            return _MISSING
+        self._local.entries.move_to_end(key)
+        return entry[0]
+
+    # Versioned invalidation
+
+    def _sync(self):
+        now = time.monotonic()
+        if (
+            self._local.checked_at is not None
+            and now - self._local.checked_at < self._sync_interval
+        ):
+            return
+        generation = self.l2.get(self.GENERATION_KEY)
+        with self._lock:
+            self._local.checked_at = now
+            if generation != self._local.generation:
+                self._local.entries.clear()
+                self._local.bytes = 0
+                self._local.generation = generation
+                self._local.stats["invalidations"] += 1
+
+    def _bump_generation(self):
+        generation = uuid.uuid4().hex
+        self.l2.set(self.GENERATION_KEY, generation, None)
+        with self._lock:
+            self._local.generation = generation
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        if self._bypass(key):
+            return self.l2.get(key, default, version)
+        local_key = self.make_and_validate_key(key, version)
+        self._sync()
+        with self._lock:
+            data = self._lookup(local_key)
+            if data is not _MISSING:
+                self._local.stats["hits"] += 1
+                return pickle.loads(data)
+            self._local.stats["misses"] += 1
+        value = self.l2.get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        with self._lock:
+            self._store(local_key, value, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version)
+        if self._bypass(key):
+            return
+        local_key = self.make_and_validate_key(key, version)
+        with self._lock:
+            self._store(local_key, value, self._timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version)
+        if not self._bypass(key):
+            with self._lock:
+                self._drop(self.make_and_validate_key(key, version))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self.l2.touch(key, timeout, version)
+        with self._lock:
+            self._drop(self.make_and_validate_key(key, version))
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version)
+        if not self._bypass(key):
+            with self._lock:
+                self._drop(self.make_and_validate_key(key, version))
+            self._bump_generation()
+        return deleted
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        result = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                data = _MISSING
+                if not self._bypass(key):
+                    data = self._lookup(self.make_and_validate_key(key, version))
+                if data is _MISSING:
+                    missing.append(key)
+                    self._local.stats["misses"] += 1
+                else:
+                    result[key] = pickle.loads(data)
+                    self._local.stats["hits"] += 1
+        if missing:
+            found = self.l2.get_many(missing, version)
+            with self._lock:
+                for key, value in found.items():
+                    if not self._bypass(key):
+                        local_key = self.make_and_validate_key(key, version)
+                        self._store(local_key, value, None)
+            result.update(found)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version)
+        with self._lock:
+            for key, value in data.items():
+                if not self._bypass(key) and key not in failed:
+                    local_key = self.make_and_validate_key(key, version)
+                    self._store(local_key, value, self._timeout(timeout))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version)
+        with self._lock:
+            for key in keys:
+                self._drop(self.make_and_validate_key(key, version))
+        self._bump_generation()
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version)
+        with self._lock:
+            self._drop(self.make_and_validate_key(key, version))
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def clear(self):
+        self.l2.clear()
+        self.clear_local()
+        self._bump_generation()
+
+    def clear_local(self):
+        """Drop the L1 of this process only."""
+        with self._lock:
+            self._local.entries.clear()
+            self._local.bytes = 0
+            self._local.checked_at = None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._local.stats)
+            stats["entries"] = len(self._local.entries)
+            stats["bytes"] = self._local.bytes
+        return stats
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+class SQLiteCache(BaseCache):
+    """A cache in a SQLite file shared by all worker processes of a host.
+
+    LOCATION is the path of the database file. Values are pickled and
+    zlib-compressed from COMPRESS_MIN_BYTES on. Once the stored payloads
+    exceed MAX_BYTES, expired entries and then the least recently read ones
+    are evicted down to 90% of it. Read times are written back at most every
+    TOUCH_INTERVAL seconds per key and hit/miss counters every STATS_INTERVAL
+    seconds, so reads rarely write.
+
+    OPTIONS: MAX_BYTES, COMPRESS_MIN_BYTES, TOUCH_INTERVAL, STATS_INTERVAL.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            expires REAL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+        CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+        CREATE TABLE IF NOT EXISTS cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO cache_stats (name, value)
+        VALUES ('bytes', 0), ('hits', 0), ('misses', 0), ('evictions', 0);
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = str(location)
+        self._max_bytes = options.get("MAX_BYTES", 64 * 1024 * 1024)
+        self._compress_min = options.get("COMPRESS_MIN_BYTES", 1024)
+        self._touch_interval = options.get("TOUCH_INTERVAL", 60)
+        self._stats_interval = options.get("STATS_INTERVAL", 5)
+        self._conn = None
+        self._pid = None
+        self._counters = {"hits": 0, "misses": 0}
+        self._flushed_at = time.monotonic()
+
+    @property
+    def _connection(self):
+        # Django creates one backend instance per thread, reconnect after fork
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                return b"z" + compressed
+        return b"p" + data
+
+    def _decode(self, blob):
+        data = blob[1:]
+        if blob[:1] == b"z":
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _count(self, name, n=1):
+        self._counters[name] += n
+        if time.monotonic() - self._flushed_at >= self._stats_interval:
+            self._flush_counters()
+
+    def _flush_counters(self):
+        counters = [(v, k) for k, v in self._counters.items() if v]
+        if counters:
+            self._connection.executemany(
+                "UPDATE cache_stats SET value = value + ? WHERE name = ?", counters
+            )
+        self._counters = dict.fromkeys(self._counters, 0)
+        self._flushed_at = time.monotonic()
+
+    def _add_bytes(self, conn, delta):
+        conn.execute(
+            "UPDATE cache_stats SET value = value + ? WHERE name = 'bytes'", (delta,)
+        )
+        (total,) = conn.execute(
+            "SELECT value FROM cache_stats WHERE name = 'bytes'"
+        ).fetchone()
+        return total
+
+    def _evict(self, conn, total, now):
+        (expired,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE expires <= ?", (now,)
+        ).fetchone()
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        total -= expired
+        target = self._max_bytes * 0.9
+        evicted = 0
+        while total > target:
+            rows = conn.execute(
+                "SELECT key, size FROM cache ORDER BY accessed LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            # Only as many of the oldest as needed to get below the target
+            victims = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                victims.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+            evicted += len(victims)
+        conn.execute(
+            "UPDATE cache_stats SET value = ? WHERE name = 'bytes'", (max(total, 0),)
+        )
+        conn.execute(
+            "UPDATE cache_stats SET value = value + ? WHERE name = 'evictions'",
+            (evicted,),
+        )
+
+    def _write(self, key, value, timeout, version, only_if_missing=False):
+        key = self.make_and_validate_key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        blob = self._encode(value)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT size, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if only_if_missing and row and (row[1] is None or row[1] > now):
+                return False
+            old_size = row[0] if row else 0
+            if expires is not None and expires <= now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._add_bytes(conn, -old_size)
+                return True
+            size = len(key) + len(blob)
+            conn.execute(
+                "INSERT INTO cache (key, value, expires, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, expires = excluded.expires, "
+                "size = excluded.size, accessed = excluded.accessed",
+                (key, blob, expires, size, now),
+            )
+            total = self._add_bytes(conn, size - old_size)
+            if total > self._max_bytes:
+                self._evict(conn, total, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version)
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count("misses")
+            return default
+        if now - row[2] >= self._touch_interval:
+            self._connection.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+        self._count("hits")
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version): key for key in keys}
+        now = time.time()
+        result = {}
+        touched = []
+        names = list(keys)
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            rows = self._connection.execute(
+                "SELECT key, value, accessed FROM cache WHERE key IN (%s) "
+                "AND (expires IS NULL OR expires > ?)" % ",".join("?" * len(chunk)),
+                (*chunk, now),
+            ).fetchall()
+            for name, blob, accessed in rows:
+                result[keys[name]] = self._decode(blob)
+                if now - accessed >= self._touch_interval:
+                    touched.append((now, name))
+        if touched:
+            self._connection.executemany(
+                "UPDATE cache SET accessed = ? WHERE key = ?", touched
+            )
+        self._count("hits", len(result))
+        self._count("misses", len(keys) - len(result))
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._write(key, value, timeout, version, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        now = time.time()
+        cursor = self._connection.execute(
+            "UPDATE cache SET expires = ?, accessed = ? WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._add_bytes(conn, -row[0])
+        return True
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        row = self._connection.execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache")
+            conn.execute("UPDATE cache_stats SET value = 0 WHERE name = 'bytes'")
+
+    def report(self, top=10):
+        """Occupancy, hit rate and largest keys, for the cache_stats command."""
+        self._flush_counters()
+        conn = self._connection
+        stats = dict(conn.execute("SELECT name, value FROM cache_stats"))
+        (entries,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        (expired,) = conn.execute(
+            "SELECT COUNT(*) FROM cache WHERE expires <= ?", (time.time(),)
+        ).fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "path": self._path,
+            "entries": entries,
+            "expired": expired,
+            "bytes": stats["bytes"],
+            "max_bytes": self._max_bytes,
+            "occupancy": stats["bytes"] / self._max_bytes,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "evictions": stats["evictions"],
+            "largest": conn.execute(
+                "SELECT key, size FROM cache ORDER BY size DESC LIMIT ?", (top,)
+            ).fetchall(),
+        }
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold the refresh lock of a key
+LOCK_TIMEOUT = 10
+# How long the other workers wait for the refresh before giving up
+WAIT_TIMEOUT = 2
+POLL_INTERVAL = 0.05
+# Refresh stale entries in a background thread, tests turn this off to
+# refresh inline instead
+BACKGROUND_REFRESH = True
+
+
+class CacheStats:
+    """Counters of how cached upstream payloads were served in this process."""
+
+    FIELDS = ("fresh", "stale", "misses", "refreshes", "refresh_errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field):
+        with self._lock:
+            self._data[field] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._data)
+
+    def reset(self):
+        with self._lock:
+            self._data = dict.fromkeys(self.FIELDS, 0)
+
+
+stats = CacheStats()
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def acquire(key, timeout=LOCK_TIMEOUT):
+    """Take the refresh lock of `key` in the shared cache, return its token,
+    or None when another worker holds it."""
+    token = uuid.uuid4().hex
+    return token if cache.add(_lock_key(key), token, timeout) else None
+
+
+def release(key, token):
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def shared():
+    """The shared tier of the cache. TieredCache answers from a per-process
+    copy, which may be older than the entry another worker just stored."""
+    return getattr(cache, "l2", cache)
+
+
+def run_in_background(key, func):
+    """Call `func()` in a daemon thread, or inline when BACKGROUND_REFRESH is
+    off. Errors are logged."""
+
+    def run():
+        try:
+            func()
+        except Exception:
+            logger.warning("Background refresh of %s failed", key, exc_info=True)
+        finally:
+            # The thread has its own database connections (DatabaseCache)
+            connections.close_all()
+
+    if BACKGROUND_REFRESH:
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+    else:
+        run()
+
+
+def _store(key, value, timeout, stale_timeout):
+    # The entry carries its soft expiry, the cache timeout is the hard one
+    cache.set(key, (value, time.time() + timeout), timeout + stale_timeout)
+
+
+def _refresh(key, fetch, timeout, stale_timeout, token):
+    try:
+        entry = shared().get(key)
+        if entry is not None and time.time() < entry[1]:
+            # Refreshed by another worker, only our local copy was outdated
+            cache.set(key, entry, entry[1] - time.time() + stale_timeout)
+            return entry[0]
+        value = fetch()
+        stats.incr("refreshes")
+        if value is not None:
+            _store(key, value, timeout, stale_timeout)
+        return value
+    except Exception:
+        stats.incr("refresh_errors")
+        raise
+    finally:
+        release(key, token)
+
+
+def single_flight(key, fetch, timeout, stale_timeout=0, default=None):
+    """Return `key` from the cache, calling `fetch()` to refresh it.
+
+    A value is fresh for `timeout` seconds, then served stale for another
+    `stale_timeout` seconds while one worker refreshes it in the background.
+    Only one worker (across processes, the lock lives in the shared cache)
+    calls `fetch()` for a given key at a time. On a hard miss the others wait
+    up to WAIT_TIMEOUT seconds for the refresh and return `default` if it
+    doesn't land. Errors raised by `fetch()` on a hard miss propagate to the
+    worker that called it. A `fetch()` returning None is not cached.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, soft_expiry = entry
+        if time.time() < soft_expiry:
+            stats.incr("fresh")
+            return value
+
+        stats.incr("stale")
+        token = acquire(key)
+        if token is not None:
+            run_in_background(
+                key, lambda: _refresh(key, fetch, timeout, stale_timeout, token)
+            )
+        return value
+
+    stats.incr("misses")
+    token = acquire(key)
+    if token is not None:
+        return _refresh(key, fetch, timeout, stale_timeout, token)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.get(_lock_key(key)) is None:
+            # The refresh finished without a value (upstream error)
+            break
+    logger.info("Gave up waiting for the refresh of %s", key)
+    return default
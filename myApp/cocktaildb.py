@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .drinks import Drink
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BASE_URL": "https://www.thecocktaildb.com/api/json/v1/1/",
+    # Dotted path of the client class, swap it for LocalCocktailDBClient
+    # to run tests and benchmarks without network.
+    "CLIENT": "myApp.cocktaildb.CocktailDBClient",
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 5,
+    "RETRIES": 2,
+    "BACKOFF_FACTOR": 0.3,
+    "POOL_MAXSIZE": 10,
+    # JSON file with a list of drinks (or {"drinks": [...]}) for the local client
+    "FIXTURES": None,
+    # Open the circuit after this many consecutive failures and probe again
+    # after BREAKER_RESET_TIMEOUT seconds
+    "BREAKER_THRESHOLD": 5,
+    "BREAKER_RESET_TIMEOUT": 30,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "COCKTAILDB", {}).get(name, DEFAULTS[name])
+
+
+class CocktailDBError(Exception):
+    """Raised when TheCocktailDB can't be reached or answers with garbage."""
+
+
+class CircuitOpenError(CocktailDBError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive upstream failures.
+
+    closed: calls go through. open: calls fail with CircuitOpenError until
+    `reset_timeout` has passed. half_open: a single probe call goes through,
+    its success closes the circuit and its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                return
+            self.rejected += 1
+        raise CircuitOpenError("TheCocktailDB circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("TheCocktailDB circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.threshold
+            ):
+                logger.warning(
+                    "TheCocktailDB circuit opened after %d failures", self.failures
+                )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+            }
+
+
+class RateLimiter:
+    """Token bucket shared by threads, `acquire()` blocks until a call may go.
+
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CallMetrics:
+    """Per-endpoint call counters and latencies for the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, endpoint, elapsed, ok):
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self._data.setdefault(
+                endpoint,
+                {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0},
+            )
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+            if not ok:
+                stats["errors"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._data.items():
+                stats = dict(stats)
+                stats["avg_ms"] = stats["total_ms"] / stats["calls"]
+                result[endpoint] = stats
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+class BaseCocktailDBClient:
+    """The CocktailDB endpoints we use, independent of the transport.
+
+    Subclasses only implement `_request(endpoint, params)` which returns the
+    decoded JSON payload of the endpoint. Drinks are returned as Drink records.
+    """
+
+    def __init__(self):
+        self.metrics = CallMetrics()
+        self.breaker = CircuitBreaker(
+            get_setting("BREAKER_THRESHOLD"), get_setting("BREAKER_RESET_TIMEOUT")
+        )
+
+    def _request(self, endpoint, params):
+        raise NotImplementedError
+
+    def _get(self, endpoint, **params):
+        self.breaker.before_call()
+        start = time.perf_counter()
+        ok = False
+        try:
+            payload = self._request(endpoint, params)
+            ok = True
+        except CocktailDBError:
+            raise
+        except (requests.RequestException, ValueError) as e:
+            raise CocktailDBError(f"{endpoint} failed: {e}") from e
+        finally:
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            elapsed = time.perf_counter() - start
+            self.metrics.record(endpoint, elapsed, ok)
+            logger.debug(
+                "cocktaildb %s %s took %.1f ms", endpoint, params, elapsed * 1000
+            )
+        return payload
+
+    def _drinks(self, endpoint, **params):
+        payload = self._get(endpoint, **params) or {}
+        # The API answers {"drinks": null} or {"drinks": "None Found"}
+        # when nothing matches.
+        drinks = payload.get("drinks")
+        return drinks if isinstance(drinks, list) else []
+
+    def random(self):
+        drinks = self._drinks("random.php")
+        return Drink.from_api(drinks[0]) if drinks else None
+
+    def search(self, name):
+        return [Drink.from_api(d) for d in self._drinks("search.php", s=name)]
+
+    def lookup(self, drink_id):
+        drinks = self._drinks("lookup.php", i=drink_id)
+        return Drink.from_api(drinks[0]) if drinks else None
+
+    def filter_by_ingredient(self, ingredient):
+        # Only id, title and picture are filled in by this endpoint
+        return [Drink.from_api(d) for d in self._drinks("filter.php", i=ingredient)]
+
+    def list_categories(self):
+        return [item["strCategory"] for item in self._drinks("list.php", c="list")]
+
+
+class CocktailDBClient(BaseCocktailDBClient):
+    """HTTP client with a pooled keep-alive session, timeouts and retries."""
+
+    def __init__(self):
+        super().__init__()
+        self.base_url = get_setting("BASE_URL")
+        self.timeout = (get_setting("CONNECT_TIMEOUT"), get_setting("READ_TIMEOUT"))
+        self.session = requests.Session()
+        retry = Retry(
+            total=get_setting("RETRIES"),
+            backoff_factor=get_setting("BACKOFF_FACTOR"),
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=1,
+            pool_maxsize=get_setting("POOL_MAXSIZE"),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _request(self, endpoint, params):
+        response = self.session.get(
+            self.base_url + endpoint, params=params, timeout=self.timeout
+        )
+        response.raise_for_status()
+        # filter.php answers an empty body for unknown ingredients
+        if not response.content:
+            return {}
+        return response.json()
+
+
+class LocalCocktailDBClient(BaseCocktailDBClient):
+    """In-memory stand-in that answers like TheCocktailDB, without network."""
+
+    def __init__(self, drinks=None):
+        super().__init__()
+        if drinks is None:
+            drinks = self._load_fixtures(get_setting("FIXTURES"))
+        self.drinks = list(drinks)
+
+    @staticmethod
+    def _load_fixtures(path):
+        if not path:
+            return []
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["drinks"] if isinstance(data, dict) else data
+
+    def _request(self, endpoint, params):
+        if endpoint == "random.php":
+            return {"drinks": [random.choice(self.drinks)] if self.drinks else None}
+        if endpoint == "search.php":
+            name = params["s"].lower().strip()
+            found = [d for d in self.drinks if name in d["strDrink"].lower()]
+            return {"drinks": found or None}
+        if endpoint == "lookup.php":
+            found = [d for d in self.drinks if str(d["idDrink"]) == str(params["i"])]
+            return {"drinks": found or None}
+        if endpoint == "filter.php":
+            name = params["i"].lower()
+            found = [
+                {k: d[k] for k in ("idDrink", "strDrink", "strDrinkThumb")}
+                for d in self.drinks
+                if any(
+                    (d.get(f"strIngredient{n}") or "").lower() == name
+                    for n in range(1, 16)
+                )
+            ]
+            return {"drinks": found or "None Found"}
+        if endpoint == "list.php":
+            categories = sorted({d["strCategory"] for d in self.drinks})
+            return {"drinks": [{"strCategory": c} for c in categories]}
+        raise CocktailDBError(f"Unknown endpoint {endpoint}")
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the client of the current process, creating it on first use.
+
+    The session is rebuilt after a fork so gunicorn workers never share
+    sockets with the master process.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = import_string(get_setting("CLIENT"))()
+                _client_pid = pid
+    return _client
+
+
+def set_client(client):
+    """Replace the process-wide client (used by tests and benchmarks)."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = client
+        _client_pid = os.getpid() if client is not None else None
@@ -0,0 +1,100 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from . import caching
+from .cocktaildb import CocktailDBError, get_client
+from .drinks import Drink
+from .models import Recipe
+
+POOL_KEY = "random_drink:pool"
+# Drinks the homepage picks from
+POOL_SIZE = 20
+# New drinks fetched per background refill, the oldest ones make room
+REFILL_COUNT = 5
+# Seconds between background refills
+REFILL_INTERVAL = 300
+# How long a worker may hold the refill lock
+LOCK_TIMEOUT = 60
+WORKERS = 4
+
+
+def _fetch_one(client):
+    try:
+        return client.random()
+    except CocktailDBError:
+        return None
+
+
+def refill(count=REFILL_COUNT, size=POOL_SIZE):
+    """Fetch `count` random drinks from TheCocktailDB and add them to the
+    front of the pool, which keeps the `size` newest distinct drinks.
+    Return the number of drinks added.
+
+    The pool is stored without expiry, a failed refill leaves it as is
+    until the next one.
+    """
+    client = get_client()
+    with ThreadPoolExecutor(max_workers=min(count, WORKERS)) as executor:
+        fetched = list(executor.map(_fetch_one, [client] * count))
+    drinks, _ = caching.shared().get(POOL_KEY, ((), 0))
+    known = {drink.id for drink in drinks}
+    pool, seen = [], set()
+    for drink in [*fetched, *drinks]:
+        if drink is not None and drink.id not in seen:
+            seen.add(drink.id)
+            pool.append(drink)
+    cache.set(POOL_KEY, (tuple(pool[:size]), time.time()), None)
+    return len(seen - known)
+
+
+def _refill_if_due(count):
+    token = caching.acquire(POOL_KEY, LOCK_TIMEOUT)
+    if token is None:
+        return
+
+    def run():
+        try:
+            entry = caching.shared().get(POOL_KEY)
+            if entry is not None and time.time() - entry[1] < REFILL_INTERVAL:
+                # Refilled by another worker, only our local copy was outdated
+                cache.set(POOL_KEY, entry, None)
+                return
+            refill(count)
+        finally:
+            caching.release(POOL_KEY, token)
+
+    caching.run_in_background(POOL_KEY, run)
+
+
+def catalog_drink():
+    """A random drink of our own catalog, None when it is empty."""
+    last = Recipe.objects.aggregate(last=Max("pk"))["last"]
+    if last is None:
+        return None
+    recipe = (
+        Recipe.objects.filter(pk__gte=random.randint(1, last))
+        .select_related("category")
+        .prefetch_related("recipe_ingredients__ingredient")
+        .order_by("pk")
+        .first()
+    )
+    return Drink.from_recipe(recipe) if recipe else None
+
+
+def pick():
+    """A random drink for the homepage, without calling TheCocktailDB.
+
+    Drinks come from the pool in the shared cache. When it is due, a
+    background thread refills it (the whole pool when it is empty); until
+    the first refill lands a drink of our catalog is shown instead.
+    """
+    drinks, refilled_at = cache.get(POOL_KEY, ((), 0))
+    if time.time() - refilled_at >= REFILL_INTERVAL:
+        _refill_if_due(REFILL_COUNT if drinks else POOL_SIZE)
+    if drinks:
+        return random.choice(drinks)
+    return catalog_drink()
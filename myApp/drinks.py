@@ -0,0 +1,59 @@
+import hashlib
+import json
+from typing import NamedTuple
+
+
+class Drink(NamedTuple):
+    """A drink from TheCocktailDB, parsed once at the API boundary.
+
+    The API returns ~50 keys per drink (15 ingredient and 15 measure slots,
+    a dozen translations, mostly null). A Drink keeps what we use, with the
+    ingredients packed as (name, measure) pairs. Being a tuple it pickles to
+    a fraction of the dict, which matters for the cached search results.
+    """
+
+    id: int
+    title: str
+    category: str = ""
+    instructions: str = ""
+    picture_url: str = ""
+    ingredients: tuple = ()
+
+    @classmethod
+    def from_api(cls, data):
+        ingredients = []
+        for number in range(1, 16):
+            name = (data.get(f"strIngredient{number}") or "").strip()
+            if not name:
+                break
+            measure = (data.get(f"strMeasure{number}") or "").strip()
+            ingredients.append((name, measure))
+        return cls(
+            id=int(data["idDrink"]),
+            title=data.get("strDrink") or "",
+            category=data.get("strCategory") or "",
+            instructions=data.get("strInstructions") or "",
+            picture_url=data.get("strDrinkThumb") or "",
+            ingredients=tuple(ingredients),
+        )
+
+    @classmethod
+    def from_recipe(cls, recipe):
+        """Build a Drink from a stored Recipe, with category and
+        recipe_ingredients__ingredient preloaded."""
+        return cls(
+            id=recipe.recipe_id,
+            title=recipe.title,
+            category=recipe.category.name if recipe.category else "",
+            instructions=recipe.instructions,
+            picture_url=recipe.picture_url,
+            ingredients=tuple(
+                (item.ingredient.name, item.amount)
+                for item in recipe.recipe_ingredients.all()
+            ),
+        )
+
+    def content_hash(self):
+        """Fingerprint of the drink, changes whenever any field changes."""
+        payload = json.dumps(self, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(payload.encode()).hexdigest()
@@ -0,0 +1,91 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .ingest import iter_batches
+from .models import Recipe, RecipeIngredient
+
+FIELDS = [
+    "id",
+    "recipe_id",
+    "title",
+    "category",
+    "instructions",
+    "picture_url",
+    "rating_count",
+    "rating_average",
+    "ingredients",
+]
+# Extra column of favorites exports
+FAVORITE_FIELDS = FIELDS + ["favorited_at"]
+CHUNK_SIZE = 1000
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def catalog():
+    return Recipe.objects.order_by("pk")
+
+
+def favorites(user):
+    return (
+        Recipe.objects.filter(favorites__user=user)
+        .annotate(favorited_at=F("favorites__created_at"))
+        .order_by("-favorited_at", "-pk")
+    )
+
+
+def iter_rows(recipes, fields=FIELDS, chunk_size=CHUNK_SIZE):
+    """Stream the recipes of a queryset as export rows (dicts of `fields`).
+
+    Recipes are read with a chunked iterator and their ingredients with one
+    query per chunk, so memory use doesn't grow with the catalog. Rating
+    aggregates are stored on the recipe.
+    """
+    columns = [name for name in fields if name not in ("category", "ingredients")]
+    rows = recipes.values(*columns, category_name=F("category__name"))
+    for batch in iter_batches(rows.iterator(chunk_size=chunk_size), chunk_size):
+        ingredients = {row["id"]: [] for row in batch}
+        recipe_ingredients = (
+            RecipeIngredient.objects.filter(recipe_id__in=ingredients)
+            .order_by("recipe_id", "order", "pk")
+            .values_list("recipe_id", "ingredient__name", "amount")
+        )
+        for recipe_id, name, amount in recipe_ingredients:
+            ingredients[recipe_id].append({"name": name, "amount": amount})
+        for row in batch:
+            row["category"] = row.pop("category_name")
+            row["ingredients"] = ingredients[row["id"]]
+            yield {name: row[name] for name in fields}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class Echo:
+    """File-like object handing back what the csv writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields=FIELDS):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        row["ingredients"] = "; ".join(
+            f"{i['name']} ({i['amount']})" if i["amount"] else i["name"]
+            for i in row["ingredients"]
+        )
+        yield writer.writerow([row[name] for name in fields])
+
+
+def export_lines(recipes, fmt, fields=FIELDS, chunk_size=CHUNK_SIZE):
+    """Lines of the `fmt` ("ndjson" or "csv") export of a recipe queryset."""
+    rows = iter_rows(recipes, fields, chunk_size)
+    if fmt == "csv":
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows)
@@ -0,0 +1,85 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import RecipeIngredient
+from .signals import catalog_state
+
+# Rating stats aren't part of the catalog version, counts may lag behind
+# ratings by this long
+FACETS_TIMEOUT = 60
+TOP_INGREDIENTS = 20
+RATING_BUCKETS = {
+    "unrated": Q(rating_count=0),
+    "0-2": Q(rating_count__gt=0, rating_average__lt=2),
+    "2-3": Q(rating_average__gte=2, rating_average__lt=3),
+    "3-4": Q(rating_average__gte=3, rating_average__lt=4),
+    "4-5": Q(rating_average__gte=4),
+}
+
+
+def count_facets(recipes, filters, facet_filter):
+    """Facet counts of `recipes` narrowed by `filters`, one grouped query
+    per facet.
+
+    The category and rating counts leave out their own filter, so they
+    show what choosing another category or rating range would give.
+    Ingredients combine, their counts are those of the filtered recipes.
+    """
+    categories = (
+        facet_filter.apply(recipes, filters, exclude="category")
+        .values("category_id", "category__name")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "category__name")
+    )
+    filtered = facet_filter.apply(recipes, filters)
+    ingredients = (
+        RecipeIngredient.objects.filter(recipe__in=filtered.values("pk"))
+        .values("ingredient_id", "ingredient__name")
+        .annotate(count=Count("recipe_id"))
+        .order_by("-count", "ingredient__name")[:TOP_INGREDIENTS]
+    )
+    ratings = facet_filter.apply(recipes, filters, exclude="rating").aggregate(
+        **{name: Count("pk", filter=bucket) for name, bucket in RATING_BUCKETS.items()}
+    )
+    return {
+        "count": filtered.count(),
+        "facets": {
+            "category": [
+                {
+                    "id": c["category_id"],
+                    "name": c["category__name"],
+                    "count": c["count"],
+                }
+                for c in categories
+            ],
+            "ingredient": [
+                {
+                    "id": i["ingredient_id"],
+                    "name": i["ingredient__name"],
+                    "count": i["count"],
+                }
+                for i in ingredients
+            ],
+            "rating": [
+                {"range": name, "count": ratings[name]} for name in RATING_BUCKETS
+            ],
+        },
+    }
+
+
+def facets_key(search_pks, filters):
+    # The search results stand for the query, equivalent queries share them
+    raw = repr((search_pks and sorted(search_pks), filters, catalog_state()))
+    return f"facets:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def cached_facets(recipes, search_pks, filters, facet_filter):
+    """count_facets() cached per normalized filter set and catalog version."""
+    key = facets_key(search_pks, filters)
+    counts = cache.get(key)
+    if counts is None:
+        counts = count_facets(recipes, filters, facet_filter)
+        cache.set(key, counts, FACETS_TIMEOUT)
+    return counts
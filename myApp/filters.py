@@ -0,0 +1,109 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import search
+from .models import RecipeIngredient
+
+# Largest value of an integer database column, bigger ids can't match and
+# would fail in the query
+MAX_ID = 2**31 - 1
+
+# Search results returned by the API at most
+SEARCH_LIMIT = 500
+
+
+class LocalSearchFilter(filters.SearchFilter):
+    """`?search=` backed by the in-process search index instead of LIKE
+    queries over joined tables. Results are annotated with their
+    `search_rank`, 0 for the best match."""
+
+    def get_search_pks(self, request):
+        """Pks of the recipes matching `?search=` best first, None without
+        a search."""
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return None
+        return search.index.search(query, SEARCH_LIMIT)
+
+    def filter_queryset(self, request, queryset, view):
+        pks = self.get_search_pks(request)
+        if pks is None:
+            return queryset
+        if not pks:
+            # Still annotated, ?ordering=rank applies to no results too
+            return queryset.none().annotate(
+                search_rank=Value(0, output_field=IntegerField())
+            )
+        search_rank = Case(
+            *(When(pk=pk, then=position) for position, pk in enumerate(pks)),
+            output_field=IntegerField(),
+        )
+        # RecipePagination orders by search_rank unless told otherwise
+        return queryset.filter(pk__in=pks).annotate(search_rank=search_rank)
+
+
+def id_list(params, name):
+    try:
+        ids = sorted({int(v) for v in params.get(name, "").split(",") if v.strip()})
+    except ValueError:
+        raise ValidationError({name: "Must be comma-separated integers."})
+    if ids and not (0 < ids[0] and ids[-1] <= MAX_ID):
+        raise ValidationError({name: f"Ids must be between 1 and {MAX_ID}."})
+    return ids
+
+
+def rate(params, name):
+    value = params.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "Must be a number."})
+    if not value.is_finite() or not 0 <= value <= 5:
+        raise ValidationError({name: "Must be between 0 and 5."})
+    return value.normalize()
+
+
+class FacetFilter(filters.BaseFilterBackend):
+    """`?category=` (any of the comma-separated category ids),
+    `?ingredient=` (all of the ingredient ids) and `?rating_min=` /
+    `?rating_max=` (on the average rating, 0 when unrated)."""
+
+    FACETS = ("category", "ingredient", "rating")
+
+    def get_filters(self, request):
+        """The filters of the request, normalized: equal filter sets give
+        equal dicts."""
+        params = request.query_params
+        return {
+            "category": id_list(params, "category"),
+            "ingredient": id_list(params, "ingredient"),
+            "rating": (rate(params, "rating_min"), rate(params, "rating_max")),
+        }
+
+    def apply(self, queryset, filters, exclude=None):
+        """Filter a recipe queryset, leaving out the `exclude` facet."""
+        if filters["category"] and exclude != "category":
+            queryset = queryset.filter(category__in=filters["category"])
+        if exclude != "ingredient":
+            for ingredient_id in filters["ingredient"]:
+                # A semi-join per ingredient, on the (ingredient, recipe) index
+                queryset = queryset.filter(
+                    pk__in=RecipeIngredient.objects.filter(
+                        ingredient_id=ingredient_id
+                    ).values("recipe_id")
+                )
+        low, high = filters["rating"]
+        if exclude != "rating":
+            if low is not None:
+                queryset = queryset.filter(rating_average__gte=low)
+            if high is not None:
+                queryset = queryset.filter(rating_average__lte=high)
+        return queryset
+
+    def filter_queryset(self, request, queryset, view):
+        return self.apply(queryset, self.get_filters(request))
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+# Serialized recipes, the user-independent part of API responses. Entries
+# are stamped with the recipe's updated_at and only served to a request
+# that loaded the same updated_at. Every change to a recipe, its
+# ingredients or its rating stats bumps updated_at, outdated entries are
+# overwritten or expire. They are never deleted: deletes drop the
+# in-process tier of every worker (see TieredCache).
+FRAGMENT_KEY = "recipe:{}:{}"
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+class FragmentStats:
+    """How serialized recipes were served in this process, and the time
+    spent building them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, hits, misses, build_seconds):
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+            self._build_seconds += build_seconds
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses, build_seconds = self._hits, self._misses, self._build_seconds
+        served = hits + misses
+        # Each hit saves what building a fragment costs on average
+        build_average = build_seconds / misses if misses else 0
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / served, 4) if served else None,
+            "build_seconds": round(build_seconds, 4),
+            "saved_seconds": round(hits * build_average, 4),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._hits = self._misses = 0
+            self._build_seconds = 0.0
+
+
+stats = FragmentStats()
+
+
+def fragment_key(name, pk):
+    return FRAGMENT_KEY.format(name, pk)
+
+
+def get_fragments(recipes, name, build):
+    """Return {pk: fragment} for `recipes`, calling build(missing recipes)
+    -> {pk: fragment} for those not cached at their current version."""
+    keys = {fragment_key(name, recipe.pk): recipe for recipe in recipes}
+    cached = cache.get_many(list(keys))
+    fragments, missing = {}, []
+    for key, recipe in keys.items():
+        entry = cached.get(key)
+        if entry is not None and entry[0] == recipe.updated_at:
+            fragments[recipe.pk] = entry[1]
+        else:
+            missing.append(recipe)
+
+    build_seconds = 0.0
+    if missing:
+        started = time.perf_counter()
+        built = build(missing)
+        build_seconds = time.perf_counter() - started
+        cache.set_many(
+            {
+                fragment_key(name, recipe.pk): (recipe.updated_at, built[recipe.pk])
+                for recipe in missing
+            },
+            FRAGMENT_TIMEOUT,
+        )
+        fragments.update(built)
+    stats.record(len(fragments) - len(missing), len(missing), build_seconds)
+    return fragments
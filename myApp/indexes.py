@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.db.models import Max
+
+from .models import Recipe
+from .signals import catalog_state, recipes_changed
+
+logger = logging.getLogger(__name__)
+
+# Every CatalogIndex instance, for warm-up and test isolation
+registry = []
+
+
+class CatalogIndex:
+    """In-process index over the recipe catalog, kept in sync with the DB.
+
+    The index is built on first use (or by warm_up()). Recipes written by
+    this process are applied on the next lookup through the recipes_changed
+    signal. Writes of other processes are noticed through the catalog
+    version in the shared cache, checked at most every SYNC_INTERVAL
+    seconds, and loaded by Recipe.updated_at; deleted recipes trigger a
+    rebuild.
+
+    Subclasses implement build() and update(recipe_pks), where update()
+    reloads the given recipes and drops the ones that no longer exist, and
+    call ensure_fresh() before each lookup.
+    """
+
+    SYNC_INTERVAL = 1
+    # Rows committed out of updated_at order are caught by re-reading a window
+    UPDATE_SLACK = timedelta(seconds=5)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+        registry.append(self)
+        recipes_changed.connect(self._recipes_changed, weak=False)
+
+    def reset(self):
+        with self._lock:
+            self._built = False
+            self._pending = set()
+            self._state = None
+            self._high_water = None
+            self._checked_at = 0
+            self.clear()
+
+    def clear(self):
+        raise NotImplementedError
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, recipe_pks):
+        raise NotImplementedError
+
+    def _recipes_changed(self, sender, recipe_pks, **kwargs):
+        with self._lock:
+            if self._built:
+                self._pending.update(recipe_pks)
+
+    def _rebuild(self):
+        # Read the markers first, changes made during the build are seen by
+        # the next check
+        self._state = catalog_state()
+        self._high_water = Recipe.objects.aggregate(latest=Max("updated_at"))["latest"]
+        self._checked_at = time.monotonic()
+        self._pending = set()
+        self.clear()
+        self.build()
+        self._built = True
+
+    def ensure_fresh(self):
+        with self._lock:
+            if not self._built:
+                self._rebuild()
+                return
+            now = time.monotonic()
+            if now - self._checked_at >= self.SYNC_INTERVAL:
+                self._checked_at = now
+                state = catalog_state()
+                if state[1] != self._state[1]:
+                    self._rebuild()
+                    return
+                if state != self._state:
+                    self._state = state
+                    self._load_changed()
+            if self._pending:
+                pending, self._pending = self._pending, set()
+                self.update(pending)
+
+    def _load_changed(self):
+        changed = Recipe.objects.all()
+        if self._high_water is not None:
+            changed = changed.filter(
+                updated_at__gte=self._high_water - self.UPDATE_SLACK
+            )
+        for pk, updated_at in changed.values_list("pk", "updated_at"):
+            self._pending.add(pk)
+            if self._high_water is None or updated_at > self._high_water:
+                self._high_water = updated_at
+
+
+def warm_up():
+    """Build every index, e.g. when a worker starts."""
+    for index in registry:
+        try:
+            index.ensure_fresh()
+        except DatabaseError:
+            # Not migrated yet, the index is built on first use instead
+            logger.warning("Could not build %s", type(index).__name__, exc_info=True)
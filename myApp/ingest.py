@@ -0,0 +1,262 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .drinks import Drink
+from .models import Category, Favorite, Ingredient, Recipe, RecipeIngredient
+from .signals import bulk_catalog_write, catalog_changed
+from .versions import bump_favorites_version
+
+
+class CatalogWriter:
+    """Write batches of Drink records into Recipe and its related tables.
+
+    Category and Ingredient ids are resolved from in-memory maps, extended
+    as new names show up, so a batch costs a fixed number of queries whatever
+    its size. Bulk imports preload the maps; writing a single drink doesn't.
+    Recipes are upserted on `recipe_id`; drinks whose content hash matches
+    the stored one are left untouched.
+    """
+
+    def __init__(self, preload=True):
+        self.category_ids = {}
+        self.ingredient_ids = {}
+        if preload:
+            self.category_ids.update(Category.objects.values_list("name", "id"))
+            self.ingredient_ids.update(Ingredient.objects.values_list("name", "id"))
+        self.counts = dict.fromkeys(
+            (
+                "recipes",
+                "unchanged",
+                "recipe_ingredients",
+                "categories",
+                "ingredients",
+            ),
+            0,
+        )
+
+    def _resolve(self, model, ids, names):
+        """Add the ids of `names` to `ids`, return how many were created."""
+        missing = {name for name in names if name not in ids}
+        if not missing:
+            return 0
+        ids.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+        missing -= ids.keys()
+        if missing:
+            # ignore_conflicts: a concurrent request may create them too
+            model.objects.bulk_create(
+                [model(name=name) for name in missing], ignore_conflicts=True
+            )
+            ids.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+        return len(missing)
+
+    def write(self, drinks):
+        """Upsert a batch of drinks, return {recipe_id: Recipe pk}."""
+        # The last occurrence of a drink in the batch wins
+        drinks = {drink.id: drink for drink in drinks}
+        hashes = {drink.id: drink.content_hash() for drink in drinks.values()}
+        recipe_pks = {}
+        stored = Recipe.objects.filter(recipe_id__in=drinks).values_list(
+            "recipe_id", "id", "content_hash"
+        )
+        for recipe_id, pk, content_hash in stored:
+            if hashes[recipe_id] == content_hash:
+                del drinks[recipe_id]
+                recipe_pks[recipe_id] = pk
+                self.counts["unchanged"] += 1
+        drinks = list(drinks.values())
+        if not drinks:
+            return recipe_pks
+
+        now = timezone.now()
+        with transaction.atomic():
+            self.counts["categories"] += self._resolve(
+                Category, self.category_ids, {d.category for d in drinks if d.category}
+            )
+            self.counts["ingredients"] += self._resolve(
+                Ingredient,
+                self.ingredient_ids,
+                {name for d in drinks for name, _ in d.ingredients},
+            )
+
+            Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        recipe_id=drink.id,
+                        title=drink.title,
+                        instructions=drink.instructions,
+                        picture_url=drink.picture_url,
+                        category_id=self.category_ids.get(drink.category),
+                        content_hash=hashes[drink.id],
+                        updated_at=now,
+                    )
+                    for drink in drinks
+                ],
+                update_conflicts=True,
+                unique_fields=["recipe_id"],
+                update_fields=[
+                    "title",
+                    "instructions",
+                    "picture_url",
+                    "category",
+                    "content_hash",
+                    "updated_at",
+                ],
+            )
+            written = dict(
+                Recipe.objects.filter(
+                    recipe_id__in=[drink.id for drink in drinks]
+                ).values_list("recipe_id", "id")
+            )
+
+            # Without the per-row post_delete receivers, which would touch
+            # the recipe and call catalog_changed() for every row
+            with bulk_catalog_write():
+                RecipeIngredient.objects.filter(
+                    recipe_id__in=written.values()
+                ).delete()
+            rows = []
+            for drink in drinks:
+                seen = set()
+                for order, (name, amount) in enumerate(drink.ingredients, start=1):
+                    ingredient_id = self.ingredient_ids[name]
+                    if ingredient_id in seen:
+                        continue
+                    seen.add(ingredient_id)
+                    rows.append(
+                        RecipeIngredient(
+                            recipe_id=written[drink.id],
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                            order=order,
+                        )
+                    )
+            RecipeIngredient.objects.bulk_create(rows)
+
+            # bulk_create sends no model signals
+            catalog_changed(written.values())
+
+        self.counts["recipes"] += len(drinks)
+        self.counts["recipe_ingredients"] += len(rows)
+        recipe_pks.update(written)
+        return recipe_pks
+
+
+def add_favorite(user, recipe_pk):
+    """Add a recipe to the user's favorites, return (favorite, created)."""
+    # get_or_create relies on the unique (user, recipe) constraint, so two
+    # concurrent requests end up with a single favorite
+    return Favorite.objects.get_or_create(user=user, recipe_id=recipe_pk)
+
+
+def favorite_drink(user, drink):
+    """Store a drink from the API if needed and add it to the user's
+    favorites, in one transaction. Return (favorite, created)."""
+    with transaction.atomic():
+        recipe_pk = CatalogWriter(preload=False).write([drink])[drink.id]
+        return add_favorite(user, recipe_pk)
+
+
+def update_favorites(user, add=(), remove=()):
+    """Add and remove recipes from the user's favorites in one transaction.
+
+    Return {"add": {pk: status}, "remove": {pk: status}}, the statuses
+    being "added", "already_favorite", "removed", "not_favorite" or
+    "not_found" for recipes that don't exist.
+    """
+    add, remove = set(add), set(remove)
+    with transaction.atomic():
+        existing = set(
+            Recipe.objects.filter(pk__in=add | remove).values_list("pk", flat=True)
+        )
+        favorites = Favorite.objects.filter(user=user, recipe_id__in=add | remove)
+        favorite_pks = set(favorites.values_list("recipe_id", flat=True))
+
+        removed = remove & favorite_pks
+        if removed:
+            # The Favorite signals bump the user's favorites version
+            Favorite.objects.filter(user=user, recipe_id__in=removed).delete()
+        added = (add & existing) - favorite_pks
+        if added:
+            # ignore_conflicts: a concurrent request may add some of them too
+            Favorite.objects.bulk_create(
+                [Favorite(user=user, recipe_id=pk) for pk in added],
+                ignore_conflicts=True,
+            )
+            # bulk_create sends no model signals
+            bump_favorites_version(user.pk)
+
+    def status(pk, done, undone):
+        if pk not in existing:
+            return "not_found"
+        return done if pk in added | removed else undone
+
+    return {
+        "add": {pk: status(pk, "added", "already_favorite") for pk in add},
+        "remove": {pk: status(pk, "removed", "not_favorite") for pk in remove},
+    }
+
+
+def iter_dump(path, chunk_size=1024 * 1024):
+    """Stream the drinks of a JSON or NDJSON dump as API-format dicts.
+
+    JSON dumps are either a list of drinks or TheCocktailDB's
+    {"drinks": [...]} payload; the array is decoded one element at a time
+    so the whole file is never held in memory. Files ending in .ndjson or
+    .jsonl are read as one drink per line.
+    """
+    with open(path, encoding="utf-8") as f:
+        if str(path).endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = ""
+        # Skip to the opening bracket of the drinks array
+        while "[" not in buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"{path} does not contain a JSON array")
+            buffer += chunk
+        pos = buffer.index("[") + 1
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                drink, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield drink
+            pos = end
+
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_drinks(raw_drinks, errors):
+    """Turn API dicts into Drink records, appending the bad ones to `errors`."""
+    for data in raw_drinks:
+        try:
+            yield Drink.from_api(data)
+        except (KeyError, TypeError, ValueError):
+            errors.append(data)
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myApp import recommend
+
+# Start time of the last run, --incremental picks up the changes made since
+WATERMARK_KEY = "recommend:built_at"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the 'users who liked this also liked' neighbours of every "
+        "recipe from favorites and ratings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Only update the recipes favorited or rated since the last run "
+                "(deletions wait for the next full build)."
+            ),
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=recommend.TOP_K,
+            help="Number of neighbours stored per recipe.",
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        watermark = cache.get(WATERMARK_KEY) if options["incremental"] else None
+        if watermark is None:
+            count = recommend.build(options["top_k"])
+            message = f"Built the neighbours of {count} recipes."
+        else:
+            changed = recommend.changed_since(watermark)
+            count = recommend.update(changed, options["top_k"]) if changed else 0
+            message = (
+                f"Updated the neighbours of {count} recipes after changes to "
+                f"{len(changed)}."
+            )
+        cache.set(WATERMARK_KEY, started, None)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.cache_backends import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = "Report occupancy, hit rate and largest keys of the SQLite caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", help="Only report this cache alias.")
+        parser.add_argument(
+            "--top", type=int, default=10, help="Number of largest keys to list."
+        )
+
+    def handle(self, *args, **options):
+        aliases = [options["alias"]] if options["alias"] else list(settings.CACHES)
+        backends = [
+            (alias, caches[alias])
+            for alias in aliases
+            if isinstance(caches[alias], SQLiteCache)
+        ]
+        if not backends:
+            raise CommandError("No SQLiteCache configured in settings.CACHES.")
+
+        for alias, backend in backends:
+            report = backend.report(top=options["top"])
+            self.stdout.write(f"[{alias}] {report['path']}")
+            self.stdout.write(
+                f"  entries: {report['entries']} ({report['expired']} expired)"
+            )
+            self.stdout.write(
+                f"  size: {report['bytes'] / 1024:.1f} KiB of "
+                f"{report['max_bytes'] / 1024:.1f} KiB "
+                f"({report['occupancy']:.1%})"
+            )
+            self.stdout.write(
+                f"  hit rate: {report['hit_rate']:.1%} "
+                f"({report['hits']} hits, {report['misses']} misses), "
+                f"{report['evictions']} evictions"
+            )
+            self.stdout.write("  largest keys:")
+            for key, size in report["largest"]:
+                self.stdout.write(f"    {size / 1024:8.1f} KiB  {key}")
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the recipe catalog, or a user's favorites, as NDJSON or CSV "
+        "with ingredients and rating stats."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(export.CONTENT_TYPES), default="ndjson"
+        )
+        parser.add_argument("--user", help="Export the favorites of this username.")
+        parser.add_argument(
+            "--output", help="File to write to, the standard output by default."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=export.CHUNK_SIZE,
+            help="Number of recipes read per query.",
+        )
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']}.")
+            recipes, fields = export.favorites(user), export.FAVORITE_FIELDS
+        else:
+            recipes, fields = export.catalog(), export.FIELDS
+
+        lines = export.export_lines(
+            recipes, options["format"], fields, options["chunk_size"]
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        count = -1 if options["format"] == "csv" else 0
+        with open(options["output"], "w", encoding="utf-8", newline="") as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {count} recipes to {options['output']}.")
+        )
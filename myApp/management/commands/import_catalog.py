@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myApp.ingest import CatalogWriter, iter_batches, iter_dump, parse_drinks
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a TheCocktailDB dump (JSON list, {'drinks': [...]} payload or "
+        "NDJSON) into Recipe, Ingredient and RecipeIngredient."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the .json or .ndjson dump.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of drinks written per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        writer = CatalogWriter()
+        errors = []
+        drinks = parse_drinks(iter_dump(options["path"]), errors)
+
+        for batch in iter_batches(drinks, options["batch_size"]):
+            writer.write(batch)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{writer.counts['recipes']} drinks imported...")
+
+        elapsed = time.perf_counter() - start
+        counts = writer.counts
+        rows = sum(n for name, n in counts.items() if name != "unchanged")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {counts['recipes']} recipes "
+                f"({counts['unchanged']} unchanged skipped), "
+                f"{counts['recipe_ingredients']} recipe ingredients, "
+                f"{counts['categories']} new categories and "
+                f"{counts['ingredients']} new ingredients in {elapsed:.2f}s "
+                f"({rows / elapsed if elapsed else rows:.0f} rows/s)."
+            )
+        )
+        if errors:
+            self.stderr.write(f"Skipped {len(errors)} malformed drinks.")
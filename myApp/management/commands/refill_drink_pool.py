@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from myApp import drink_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch random drinks from TheCocktailDB into the pool the homepage "
+        "picks from. Run it periodically to keep the pool rotating."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=drink_pool.POOL_SIZE,
+            help="Random drinks to fetch.",
+        )
+
+    def handle(self, *args, **options):
+        added = drink_pool.refill(options["count"])
+        drinks, _ = cache.get(drink_pool.POOL_KEY, ((), 0))
+        self.stdout.write(
+            self.style.SUCCESS(f"Added {added} drinks, the pool has {len(drinks)}.")
+        )
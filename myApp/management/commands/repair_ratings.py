@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from myApp.ratings import recompute_rating_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the rating count, sum and average stored on every recipe "
+        "from the Rating table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of recipes written per UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        repaired = recompute_rating_stats(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired the rating stats of {repaired} recipes.")
+        )
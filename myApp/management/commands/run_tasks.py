@@ -0,0 +1,66 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from myApp import tasks
+
+
+class Command(BaseCommand):
+    help = "Run the jobs enqueued by the views (see myApp/tasks.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=tasks.get_setting("WORKERS"),
+            help="Jobs run concurrently, 1 runs them in the main thread.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=1,
+            help="Seconds between checks for new jobs when idle.",
+        )
+
+    def handle(self, *args, **options):
+        outcomes = Counter()
+        start = time.perf_counter()
+        workers = options["workers"]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if workers > 1:
+                run = partial(executor.map, tasks.run_in_thread)
+            else:
+                # For SQLite, which allows a single writer anyway
+                run = partial(map, tasks.run)
+            while True:
+                lost = tasks.requeue_lost()
+                if lost:
+                    self.stderr.write(f"Requeued {lost} timed out jobs.")
+                jobs = tasks.claim(workers)
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+                for job in run(jobs):
+                    outcomes[job.status] += 1
+                    self.stdout.write(
+                        f"{job.name} #{job.pk}: {job.status} in {job.duration:.3f}s"
+                    )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ran {sum(outcomes.values())} jobs in {elapsed:.2f}s: "
+                f"{outcomes['done']} done, {outcomes['pending']} to retry, "
+                f"{outcomes['failed']} failed."
+            )
+        )
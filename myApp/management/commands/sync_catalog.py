@@ -0,0 +1,106 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from myApp.cocktaildb import (
+    CircuitOpenError,
+    CocktailDBError,
+    RateLimiter,
+    get_client,
+)
+from myApp.ingest import CatalogWriter, iter_batches
+from myApp.models import Recipe
+
+CHECKPOINT_KEY = "sync_catalog:checkpoint"
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-fetch the stored recipes from TheCocktailDB and update the ones "
+        "whose content changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Concurrent lookup requests."
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=5,
+            help="Maximum lookup requests per second (0 for no limit).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of recipes fetched and written per transaction.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue after the last recipe of an interrupted run.",
+        )
+
+    def handle(self, *args, **options):
+        client = get_client()
+        limiter = RateLimiter(options["rate"])
+        writer = CatalogWriter()
+        stats = dict.fromkeys(("checked", "missing", "errors"), 0)
+
+        def lookup(recipe_id):
+            limiter.acquire()
+            return client.lookup(recipe_id)
+
+        recipe_ids = Recipe.objects.order_by("recipe_id").values_list(
+            "recipe_id", flat=True
+        )
+        checkpoint = cache.get(CHECKPOINT_KEY) if options["resume"] else None
+        if checkpoint is not None:
+            self.stdout.write(f"Resuming after recipe {checkpoint}.")
+            recipe_ids = recipe_ids.filter(recipe_id__gt=checkpoint)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for batch in iter_batches(list(recipe_ids), options["batch_size"]):
+                futures = [(i, executor.submit(lookup, i)) for i in batch]
+                drinks = []
+                try:
+                    for recipe_id, future in futures:
+                        try:
+                            drink = future.result()
+                        except CircuitOpenError:
+                            raise
+                        except CocktailDBError as e:
+                            stats["errors"] += 1
+                            self.stderr.write(f"Recipe {recipe_id}: {e}")
+                            continue
+                        if drink is None:
+                            stats["missing"] += 1
+                        else:
+                            drinks.append(drink)
+                except CircuitOpenError:
+                    for _, future in futures:
+                        future.cancel()
+                    self.stderr.write(
+                        "TheCocktailDB is failing, stopped. Run again with "
+                        "--resume to continue."
+                    )
+                    break
+                writer.write(drinks)
+                stats["checked"] += len(batch)
+                cache.set(CHECKPOINT_KEY, batch[-1], None)
+            else:
+                cache.delete(CHECKPOINT_KEY)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {stats['checked']} recipes in {elapsed:.2f}s: "
+                f"{writer.counts['recipes']} updated, "
+                f"{writer.counts['unchanged']} unchanged, "
+                f"{stats['missing']} missing upstream, {stats['errors']} errors."
+            )
+        )
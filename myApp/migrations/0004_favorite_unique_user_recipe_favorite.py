@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    # Keep the oldest favorite of every (user, recipe) pair
+    Favorite = apps.get_model("myApp", "Favorite")
+    keep = (
+        Favorite.objects.values("user", "recipe")
+        .annotate(keep_id=models.Min("id"))
+        .values("keep_id")
+    )
+    Favorite.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0003_recipe_content_hash_recipe_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="favorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_user_recipe_favorite"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:59
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def compute_rating_stats(apps, schema_editor):
+    Recipe = apps.get_model("myApp", "Recipe")
+    Rating = apps.get_model("myApp", "Rating")
+    ratings = (
+        Rating.objects.filter(recipe=models.OuterRef("pk")).order_by().values("recipe")
+    )
+    Recipe.objects.update(
+        rating_count=Coalesce(
+            models.Subquery(ratings.annotate(n=models.Count("pk")).values("n")), 0
+        ),
+        rating_sum=Coalesce(
+            models.Subquery(ratings.annotate(s=models.Sum("rate")).values("s")),
+            models.Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=1),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0004_favorite_unique_user_recipe_favorite"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_sum",
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_average",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(rating_count=0, then=models.Value(0.0)),
+                    default=django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.comparison.Cast(
+                            "rating_sum", models.FloatField()
+                        ),
+                        "/",
+                        models.F("rating_count"),
+                    ),
+                ),
+                output_field=models.DecimalField(decimal_places=1, max_digits=2),
+            ),
+        ),
+        migrations.RunPython(compute_rating_stats, migrations.RunPython.noop),
+    ]
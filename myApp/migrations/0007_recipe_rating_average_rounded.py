@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:04
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0006_favorite_user_created_idx"),
+    ]
+
+    operations = [
+        # Generated fields can't be altered, the column is recreated
+        migrations.RemoveField(
+            model_name="recipe",
+            name="rating_average",
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_average",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(rating_count=0, then=models.Value(0.0)),
+                    default=django.db.models.functions.math.Round(
+                        django.db.models.expressions.CombinedExpression(
+                            django.db.models.functions.comparison.Cast(
+                                "rating_sum", models.FloatField()
+                            ),
+                            "/",
+                            models.F("rating_count"),
+                        ),
+                        1,
+                    ),
+                ),
+                output_field=models.DecimalField(decimal_places=1, max_digits=2),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["rating_average", "id"], name="recipe_rating_idx"
+            ),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -27,17 +30,39 @@ class Recipe(models.Model):
         Category, on_delete=models.SET_NULL, null=True, blank=True
     )
     ingredients = models.ManyToManyField(Ingredient, through="RecipeIngredient")
+    # Hash of the normalized API payload, to skip unchanged drinks on refresh
+    content_hash = models.CharField(max_length=40, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Rating stats, kept up to date by the Rating signals (myApp/signals.py),
+    # `python manage.py repair_ratings` recomputes them
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    rating_average = models.GeneratedField(
+        expression=models.Case(
+            models.When(rating_count=0, then=models.Value(0.0)),
+            default=Round(
+                Cast("rating_sum", models.FloatField()) / F("rating_count"), 1
+            ),
+        ),
+        output_field=models.DecimalField(max_digits=2, decimal_places=1),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination by rating, see myApp/pagination.py
+            models.Index(fields=["rating_average", "id"], name="recipe_rating_idx"),
+            # Category facet combined with a rating range, see myApp/filters.py
+            models.Index(
+                fields=["category", "rating_average"], name="recipe_category_rating_idx"
+            ),
+        ]
 
     def get_average_rating(self):
-        ratings = self.ratings.all()
-        if not ratings:
-            return Decimal("0.0")
-        else:
-            total = sum(rating.rate for rating in ratings)
-        return Decimal(round(total / len(ratings), 1))
+        return self.rating_average
 
     def get_rates_number(self):
-        return len(self.ratings.all())
+        return self.rating_count
 
     def __str__(self):
         return self.title
@@ -54,6 +79,12 @@ class RecipeIngredient(models.Model):
     class Meta:
         unique_together = (("recipe", "ingredient"),)
         ordering = ["order"]  # Ensure the default ordering by the order field
+        indexes = [
+            # Recipes of an ingredient, for the ingredient facet
+            models.Index(
+                fields=["ingredient", "recipe"], name="recipe_ingredient_lookup_idx"
+            )
+        ]
 
     def __str__(self):
         return f"{self.amount} {self.ingredient.name} in {self.recipe.title}"
@@ -66,6 +97,21 @@ class Favorite(models.Model):
     )
     created_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # A recipe can be in a user's favorites only once, this is what makes
+        # concurrent "add to favorite" requests safe
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_user_recipe_favorite"
+            )
+        ]
+        # The favorites pages list a user's favorites newest first
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "id"], name="favorite_user_created_idx"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user.username} added {self.recipe.title}"
 
@@ -81,6 +127,14 @@ class Rating(models.Model):
     date = models.DateTimeField(auto_now=True)
     review = models.CharField(max_length=250, null=True, blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the recipe's rating stats include, in case the rating changes
+        if "rate" in field_names and "recipe_id" in field_names:
+            instance._stored = (instance.recipe_id, instance.rate)
+        return instance
+
     class Meta:
         # We don't want a user gives more than one rating to a recipe
         constraints = [
@@ -91,3 +145,67 @@ class Rating(models.Model):
 
     def __str__(self):
         return f"{self.user.username} rateed {self.rate} to {self.recipe.title}"
+
+
+class RecipeSimilarity(models.Model):
+    """A recipe's nearest neighbours by the users who liked both, built by
+    `python manage.py build_recommendations` (see myApp/recommend.py)."""
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="+")
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "similar"], name="unique_recipe_similarity"
+            )
+        ]
+        # Neighbours are read best first
+        indexes = [
+            models.Index(fields=["recipe", "-score"], name="similarity_recipe_idx")
+        ]
+
+
+class Job(models.Model):
+    """Deferred work run by `python manage.py run_tasks`, see myApp/tasks.py."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    # Enqueueing a job whose key is already pending returns that job
+    key = models.CharField(max_length=200, blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Seconds taken by the last attempt
+    duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status="pending") & ~models.Q(key=""),
+                name="unique_pending_job_key",
+            )
+        ]
+        # The worker claims the pending jobs that are due, oldest first
+        indexes = [models.Index(fields=["status", "run_after"], name="job_due_idx")]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
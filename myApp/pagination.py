@@ -0,0 +1,191 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import BadRequest, ValidationError as DjangoValidationError
+from django.db.models import GeneratedField, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(value), int(pk)
+    except ValueError:
+        raise BadRequest("Invalid cursor.")
+
+
+def keyset_page(queryset, cursor, page_size, field="created_at"):
+    """Return (items, next cursor) of a page ordered by newest `field` first.
+
+    A page starts after the last row of the previous one, identified by the
+    cursor, instead of skipping rows with OFFSET: every page costs the same
+    index range scan, and rows added meanwhile don't shift the pages.
+    """
+    queryset = queryset.order_by(f"-{field}", "-pk")
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk})
+        )
+    items = list(queryset[: page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    return items, encode_cursor(getattr(items[-1], field), items[-1].pk)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique ordering, for the API.
+
+    The cursor holds the ordering values of the last row of the page and
+    the next page is filtered on them, so deep pages cost the same as the
+    first one (DRF's CursorPagination keys on the first ordering field only
+    and falls back to OFFSET on ties, which rating orderings are full of).
+    Pages go forward only.
+
+    Query parameters: `cursor`, `ordering` (a key of `orderings`),
+    `page_size` (at most `max_page_size`) and `count=false` to leave out
+    the total count and its COUNT(*) query.
+    """
+
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    max_page_size = 100
+    # {name: ordering fields}, the fields taken together must be unique
+    orderings = {}
+    default_ordering = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset):
+        name = request.query_params.get(self.ordering_query_param)
+        if name is None:
+            name = self.get_default_ordering(queryset)
+        if name not in self.orderings:
+            raise ValidationError(
+                {self.ordering_query_param: f"One of {', '.join(self.orderings)}."}
+            )
+        return name
+
+    def get_default_ordering(self, queryset):
+        return self.default_ordering
+
+    def encode_cursor(self, row):
+        values = [getattr(row, field.lstrip("-")) for field in self.fields]
+        raw = json.dumps(values, default=str).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def get_field(self, queryset, name):
+        """The model or annotation field of an ordering field."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        field = queryset.model._meta.get_field(name)
+        if isinstance(field, GeneratedField):
+            return field.output_field
+        return field
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound("Invalid cursor.")
+        try:
+            values = [
+                self.get_field(queryset, field.lstrip("-")).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        # The ordering fields are never null
+        if None in values:
+            raise NotFound("Invalid cursor.")
+        return values
+
+    def after(self, values):
+        """Rows coming after `values` in the ordering."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.fields, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fields = self.orderings[self.get_ordering(request, queryset)]
+        queryset = queryset.order_by(*self.fields)
+        self.count = None
+        if request.query_params.get(self.count_query_param) not in ("false", "0"):
+            self.count = queryset.count()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor, queryset)))
+        page_size = self.get_page_size(request)
+        rows = list(queryset[: page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(rows[-1])
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        response = {"next": self.get_next_link(), "results": data}
+        if self.count is not None:
+            response = {"count": self.count, **response}
+        return Response(response)
+
+
+class RecipePagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "rating": ("rating_average", "id"),
+        "-rating": ("-rating_average", "-id"),
+        # Search relevance, see LocalSearchFilter
+        "rank": ("search_rank", "id"),
+    }
+    default_ordering = "id"
+
+    def get_default_ordering(self, queryset):
+        if "search_rank" in queryset.query.annotations:
+            return "rank"
+        return self.default_ordering
+
+    def get_ordering(self, request, queryset):
+        name = super().get_ordering(request, queryset)
+        if name == "rank" and "search_rank" not in queryset.query.annotations:
+            raise ValidationError({self.ordering_query_param: "rank needs ?search=."})
+        return name
+
+
+class RatingPagination(KeysetPagination):
+    orderings = {"-date": ("-date", "-id")}
+    default_ordering = "-date"
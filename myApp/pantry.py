@@ -0,0 +1,211 @@
+from collections import defaultdict
+
+from .indexes import CatalogIndex
+from .models import Ingredient, RecipeIngredient
+from .search import fold
+
+LOAD_CHUNK_SIZE = 500
+# Similar drinks shown for a recipe
+SIMILAR_DRINKS = 10
+
+
+def count_bits(bitsets):
+    """Add up bitsets position by position.
+
+    Returns the counts as bit slices: bit r of slices[i] is bit i of the
+    number of bitsets having bit r set. Adding a bitset costs a handful of
+    big-int operations whatever the number of positions.
+    """
+    slices = []
+    for carry in bitsets:
+        for i, bits in enumerate(slices):
+            if not carry:
+                break
+            slices[i] = bits ^ carry
+            carry &= bits
+        if carry:
+            slices.append(carry)
+    return slices
+
+
+def equal_bits(slices, value, among):
+    """Positions of `among` whose count in `slices` equals `value`."""
+    if value >> len(slices):
+        return 0
+    result = among
+    for i, bits in enumerate(slices):
+        result &= bits if value >> i & 1 else ~bits
+    return result
+
+
+class PantryIndex(CatalogIndex):
+    """Which recipes can be made from a set of ingredients.
+
+    Every recipe gets a slot, a bit position. Each ingredient has a bitset
+    of the slots of the recipes using it, and recipes are grouped by their
+    number of ingredients in bitsets too. For a pantry, the bitsets of its
+    ingredients are added up into per-recipe counts of owned ingredients,
+    and the recipes missing m ingredients out of n are those of the n group
+    whose count equals n - m. No recipe is looked at one by one except the
+    ones returned.
+    """
+
+    def clear(self):
+        self._slots = {}
+        self._free_slots = []
+        self._recipes = []
+        self._bitsets = defaultdict(int)
+        self._sizes = defaultdict(int)
+        self._ingredient_ids = {}
+        self._ingredient_names = {}
+
+    def build(self):
+        self._load_ingredients(Ingredient.objects.all())
+        self._load_recipes(RecipeIngredient.objects.all())
+
+    def update(self, recipe_pks):
+        recipe_pks = list(recipe_pks)
+        for pk in recipe_pks:
+            self._remove(pk)
+        for start in range(0, len(recipe_pks), LOAD_CHUNK_SIZE):
+            rows = RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_pks[start : start + LOAD_CHUNK_SIZE]
+            )
+            self._load_recipes(rows)
+
+    def _load_ingredients(self, ingredients):
+        for pk, name in ingredients.values_list("pk", "name"):
+            self._ingredient_ids[fold(name).strip()] = pk
+            self._ingredient_names[pk] = name
+
+    def _load_recipes(self, recipe_ingredients):
+        ingredients = defaultdict(list)
+        # Keep the recipe's order, missing ingredients are listed in it
+        rows = recipe_ingredients.values_list("recipe_id", "ingredient_id")
+        for recipe_pk, ingredient_id in rows:
+            ingredients[recipe_pk].append(ingredient_id)
+        for recipe_pk, ingredient_ids in ingredients.items():
+            self._add(recipe_pk, tuple(ingredient_ids))
+        new_ingredients = set(self._bitsets) - self._ingredient_names.keys()
+        if new_ingredients:
+            self._load_ingredients(Ingredient.objects.filter(pk__in=new_ingredients))
+
+    def _add(self, recipe_pk, ingredient_ids):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._recipes[slot] = (recipe_pk, ingredient_ids)
+        else:
+            slot = len(self._recipes)
+            self._recipes.append((recipe_pk, ingredient_ids))
+        self._slots[recipe_pk] = slot
+        bit = 1 << slot
+        for ingredient_id in ingredient_ids:
+            self._bitsets[ingredient_id] |= bit
+        self._sizes[len(ingredient_ids)] |= bit
+
+    def _remove(self, recipe_pk):
+        slot = self._slots.pop(recipe_pk, None)
+        if slot is None:
+            return
+        _, ingredient_ids = self._recipes[slot]
+        mask = ~(1 << slot)
+        for ingredient_id in ingredient_ids:
+            self._bitsets[ingredient_id] &= mask
+        self._sizes[len(ingredient_ids)] &= mask
+        self._recipes[slot] = None
+        self._free_slots.append(slot)
+
+    def resolve(self, names):
+        """Split ingredient names into ({id: name} known, [unknown names])."""
+        self.ensure_fresh()
+        known, unknown = {}, []
+        with self._lock:
+            for name in names:
+                pk = self._ingredient_ids.get(fold(name).strip())
+                if pk is None:
+                    unknown.append(name)
+                else:
+                    known[pk] = self._ingredient_names[pk]
+        return known, unknown
+
+    def makeable(self, ingredient_ids, max_missing=0, limit=20):
+        """Return (count, matches) of the recipes using at least one of
+        `ingredient_ids` and missing at most `max_missing` other ones.
+
+        Matches are (recipe pk, ingredient ids, missing ingredient ids)
+        ranked by the share of the recipe's ingredients owned, then fewest
+        missing.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            owned = set(ingredient_ids)
+            counts = count_bits(
+                self._bitsets[pk] for pk in owned if pk in self._bitsets
+            )
+            groups = sorted(
+                (-(size - missing) / size, missing, size)
+                for size in self._sizes
+                if size
+                for missing in range(min(max_missing, size - 1) + 1)
+            )
+            count = 0
+            matches = []
+            for _, missing, size in groups:
+                bits = equal_bits(counts, size - missing, self._sizes[size])
+                count += bits.bit_count()
+                while bits and len(matches) < limit:
+                    lowest = bits & -bits
+                    bits ^= lowest
+                    recipe_pk, recipe_ingredients = self._recipes[
+                        lowest.bit_length() - 1
+                    ]
+                    matches.append(
+                        (
+                            recipe_pk,
+                            recipe_ingredients,
+                            [pk for pk in recipe_ingredients if pk not in owned],
+                        )
+                    )
+            return count, matches
+
+    def similar(self, recipe_pk, limit=10):
+        """Return [(recipe pk, Jaccard similarity)] of the recipes whose
+        ingredients overlap the most with those of `recipe_pk`, best first.
+
+        The shared ingredient counts of every recipe come from adding up
+        the bitsets of the recipe's ingredients. A recipe of n ingredients
+        sharing s with one of m has a similarity of s / (m + n - s), so the
+        (s, n) groups are visited by decreasing similarity until `limit`
+        recipes are found: exact, without comparing recipes one by one.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            slot = self._slots.get(recipe_pk)
+            if slot is None:
+                return []
+            ingredient_ids = set(self._recipes[slot][1])
+            own = len(ingredient_ids)
+            counts = count_bits(self._bitsets[pk] for pk in ingredient_ids)
+            others = ~(1 << slot)
+            groups = sorted(
+                (-shared / (own + size - shared), shared, size)
+                for size in self._sizes
+                if size
+                for shared in range(1, min(own, size) + 1)
+            )
+            matches = []
+            for score, shared, size in groups:
+                if len(matches) >= limit:
+                    break
+                bits = equal_bits(counts, shared, self._sizes[size]) & others
+                while bits and len(matches) < limit:
+                    lowest = bits & -bits
+                    bits ^= lowest
+                    matches.append((self._recipes[lowest.bit_length() - 1][0], -score))
+            return matches
+
+    def ingredient_name(self, pk):
+        return self._ingredient_names.get(pk, "")
+
+
+index = PantryIndex()
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from .models import Recipe
+
+RATING_FIELDS = ["rating_count", "rating_sum", "rating_average"]
+
+
+def apply_rating_delta(recipe_pk, count, amount):
+    """Add `count` ratings worth `amount` in total to a recipe's stats.
+
+    A single UPDATE computed by the database from the stored values, so
+    concurrent ratings of the same recipe can't overwrite each other.
+    updated_at is bumped too, it versions the recipe's responses.
+    """
+    Recipe.objects.filter(pk=recipe_pk).update(
+        rating_count=F("rating_count") + count,
+        rating_sum=F("rating_sum") + Decimal(str(amount)),
+        updated_at=Now(),
+    )
+
+
+def recompute_rating_stats(recipe_pks=None, batch_size=1000):
+    """Recompute rating stats from the Rating table, return the number of
+    recipes whose stored stats were wrong.
+
+    The stale recipes are found with one aggregate query, only those are
+    written.
+    """
+    recipes = Recipe.objects.all()
+    if recipe_pks is not None:
+        recipes = recipes.filter(pk__in=recipe_pks)
+    stale = (
+        recipes.annotate(
+            count=Count("ratings"),
+            total=Coalesce(
+                Sum("ratings__rate"),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=1),
+            ),
+        )
+        .filter(~Q(rating_count=F("count")) | ~Q(rating_sum=F("total")))
+        .values_list("pk", "count", "total")
+    )
+    now = timezone.now()
+    repaired = [
+        Recipe(pk=pk, rating_count=count, rating_sum=total, updated_at=now)
+        for pk, count, total in stale
+    ]
+    Recipe.objects.bulk_update(
+        repaired, ["rating_count", "rating_sum", "updated_at"], batch_size=batch_size
+    )
+    return len(repaired)
@@ -0,0 +1,205 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Favorite, Rating, RecipeSimilarity
+
+# Neighbours stored per recipe
+TOP_K = 20
+# Interactions of a user taken into account at most, the pairs counted per
+# user grow with its square
+MAX_PROFILE = 200
+# Ratings at or below this are not a sign of liking the recipe
+MIN_LIKED_RATE = 2
+WRITE_BATCH_SIZE = 1000
+
+
+def rating_weight(rate):
+    return max(float(rate) - MIN_LIKED_RATE, 0) / (5 - MIN_LIKED_RATE)
+
+
+def load_profiles(users=None, recipes=None):
+    """Return {user_id: {recipe_pk: weight}} of the given users or recipes.
+
+    A favorite weighs 1, a rating from 0 (MIN_LIKED_RATE or less) to 1 (5
+    stars), the higher of the two counts.
+    """
+    condition = Q()
+    if users is not None:
+        condition &= Q(user__in=users)
+    if recipes is not None:
+        condition &= Q(recipe__in=recipes)
+    profiles = defaultdict(dict)
+    for user_id, recipe_pk in Favorite.objects.filter(condition).values_list(
+        "user_id", "recipe_id"
+    ):
+        profiles[user_id][recipe_pk] = 1.0
+    ratings = Rating.objects.filter(condition, rate__gt=MIN_LIKED_RATE)
+    for user_id, recipe_pk, rate in ratings.values_list("user_id", "recipe_id", "rate"):
+        profile = profiles[user_id]
+        profile[recipe_pk] = max(profile.get(recipe_pk, 0), rating_weight(rate))
+    return profiles
+
+
+def capped(profile):
+    if len(profile) <= MAX_PROFILE:
+        return profile
+    return dict(heapq.nlargest(MAX_PROFILE, profile.items(), key=lambda i: i[1]))
+
+
+def norms(profiles):
+    squares = defaultdict(float)
+    for profile in profiles.values():
+        for recipe_pk, weight in profile.items():
+            squares[recipe_pk] += weight * weight
+    return {recipe_pk: math.sqrt(square) for recipe_pk, square in squares.items()}
+
+
+def top_neighbours(recipe_pk, dots, norms, k=TOP_K):
+    """The k (score, similar pk) pairs of highest cosine similarity."""
+    return heapq.nlargest(
+        k,
+        (
+            (dot / (norms[recipe_pk] * norms[other]), other)
+            for other, dot in dots.items()
+        ),
+    )
+
+
+def write_neighbours(neighbours, replaced):
+    """Replace the stored neighbours of the `replaced` recipe pks (None for
+    all) with `neighbours` ({recipe_pk: [(score, similar pk)]})."""
+    rows = (
+        RecipeSimilarity(recipe_id=recipe_pk, similar_id=other, score=score)
+        for recipe_pk, pairs in neighbours.items()
+        for score, other in pairs
+    )
+    with transaction.atomic():
+        stored = RecipeSimilarity.objects.all()
+        if replaced is not None:
+            stored = stored.filter(recipe__in=replaced)
+        stored.delete()
+        RecipeSimilarity.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+
+
+def build(k=TOP_K):
+    """Compute the item-item cosine similarities of every recipe from all
+    favorites and ratings, store the top k of each. Return the number of
+    recipes with neighbours.
+
+    The user x recipe matrix is walked user by user, each pair of recipes
+    of a profile adds to their dot product, so only pairs liked by a common
+    user are ever touched.
+    """
+    profiles = load_profiles()
+    dots = defaultdict(lambda: defaultdict(float))
+    for profile in profiles.values():
+        for (a, weight_a), (b, weight_b) in combinations(capped(profile).items(), 2):
+            dots[a][b] += weight_a * weight_b
+            dots[b][a] += weight_a * weight_b
+    recipe_norms = norms(profiles)
+    neighbours = {
+        recipe_pk: top_neighbours(recipe_pk, others, recipe_norms, k)
+        for recipe_pk, others in dots.items()
+    }
+    write_neighbours(neighbours, None)
+    return len(neighbours)
+
+
+def update(recipe_pks, k=TOP_K):
+    """Recompute the neighbours of recipes whose favorites or ratings
+    changed, and their similarity in the lists of other recipes, without a
+    full build. Return the number of recipe lists rewritten.
+
+    Only the profiles of the users who liked the changed recipes are read,
+    plus what the norms of their co-liked recipes need. A recipe dropping
+    out of another's top k doesn't bring back the k+1th neighbour, build()
+    restores it.
+    """
+    changed = set(recipe_pks)
+    users = load_profiles(recipes=changed).keys()
+    profiles = {
+        user_id: capped(profile)
+        for user_id, profile in load_profiles(users=users).items()
+    }
+    dots = {recipe_pk: defaultdict(float) for recipe_pk in changed}
+    for profile in profiles.values():
+        for recipe_pk in changed & profile.keys():
+            for other, weight in profile.items():
+                if other != recipe_pk:
+                    dots[recipe_pk][other] += profile[recipe_pk] * weight
+    related = {other for others in dots.values() for other in others}
+    recipe_norms = norms(load_profiles(recipes=related | changed))
+
+    neighbours = {
+        recipe_pk: top_neighbours(recipe_pk, dots[recipe_pk], recipe_norms, k)
+        for recipe_pk in changed
+    }
+    # Lists of other recipes that had or get one of the changed recipes
+    touched = (
+        related
+        | set(
+            RecipeSimilarity.objects.filter(similar__in=changed).values_list(
+                "recipe_id", flat=True
+            )
+        )
+    ) - changed
+    stored = defaultdict(list)
+    for recipe_pk, other, score in RecipeSimilarity.objects.filter(
+        recipe__in=touched
+    ).values_list("recipe_id", "similar_id", "score"):
+        stored[recipe_pk].append((score, other))
+    for recipe_pk in touched:
+        pairs = [pair for pair in stored[recipe_pk] if pair[1] not in changed]
+        for other in changed:
+            if recipe_pk in dots[other]:
+                norm = recipe_norms[recipe_pk] * recipe_norms[other]
+                pairs.append((dots[other][recipe_pk] / norm, other))
+        pairs = heapq.nlargest(k, pairs)
+        # Most lists of popular recipes don't change, rewriting them would
+        # cost more than the computation
+        if pairs != sorted(stored[recipe_pk], reverse=True):
+            neighbours[recipe_pk] = pairs
+    write_neighbours(neighbours, neighbours.keys())
+    return len(neighbours)
+
+
+def changed_since(timestamp):
+    """Recipes favorited or rated since `timestamp`."""
+    return set(
+        Favorite.objects.filter(created_at__gte=timestamp).values_list(
+            "recipe_id", flat=True
+        )
+    ) | set(
+        Rating.objects.filter(date__gte=timestamp).values_list("recipe_id", flat=True)
+    )
+
+
+def similar_recipes(recipe_pk, limit=10):
+    """[(similar pk, score)] best first."""
+    return list(
+        RecipeSimilarity.objects.filter(recipe_id=recipe_pk)
+        .order_by("-score")
+        .values_list("similar_id", "score")[:limit]
+    )
+
+
+def recommend_for_user(user, limit=20):
+    """[(recipe pk, score)] of recipes like those the user liked, that the
+    user didn't favorite or rate yet, best first."""
+    profile = capped(load_profiles(users=[user.pk]).get(user.pk, {}))
+    seen = set(
+        Favorite.objects.filter(user=user).values_list("recipe_id", flat=True)
+    ) | set(Rating.objects.filter(user=user).values_list("recipe_id", flat=True))
+    scores = defaultdict(float)
+    neighbours = RecipeSimilarity.objects.filter(recipe__in=profile).values_list(
+        "recipe_id", "similar_id", "score"
+    )
+    for recipe_pk, other, score in neighbours:
+        if other not in seen:
+            scores[other] += profile[recipe_pk] * score
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
@@ -0,0 +1,181 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from .indexes import CatalogIndex
+from .models import Recipe, RecipeIngredient
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOP_WORDS = frozenset(
+    "a an and as at be by for from in into is it of on or the then to with".split()
+)
+
+# How much a term counts depending on where it was found
+FIELD_WEIGHTS = {"title": 6, "ingredient": 4, "category": 3, "instructions": 1}
+
+# A prefix matches at most this many terms of the vocabulary
+MAX_EXPANSIONS = 50
+
+LOAD_CHUNK_SIZE = 500
+
+# Results of this many recent queries are kept until the index changes
+RESULT_CACHE_SIZE = 1024
+
+
+def fold(text):
+    """Lowercase `text` and strip its accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Lowercase, accent-free words of `text`, without stop words."""
+    return [word for word in TOKEN_RE.findall(fold(text)) if word not in STOP_WORDS]
+
+
+class SearchIndex(CatalogIndex):
+    """Inverted index over recipe titles, ingredients, categories and
+    instructions.
+
+    Each term maps to {recipe pk: weight}, the weight adding up the
+    FIELD_WEIGHTS of the fields the term occurs in, damped for repeats.
+    Queries match all their terms, the last one as a prefix so partially
+    typed words work, and are ranked by the idf-weighted sum of the term
+    weights.
+    """
+
+    def clear(self):
+        self._postings = defaultdict(dict)
+        self._terms = {}
+        self._vocabulary = None
+        self._results = {}
+
+    def build(self):
+        self._load(Recipe.objects.all())
+
+    def update(self, recipe_pks):
+        recipe_pks = list(recipe_pks)
+        for pk in recipe_pks:
+            self._remove(pk)
+        for start in range(0, len(recipe_pks), LOAD_CHUNK_SIZE):
+            chunk = recipe_pks[start : start + LOAD_CHUNK_SIZE]
+            self._load(Recipe.objects.filter(pk__in=chunk))
+
+    def _load(self, recipes):
+        ingredients = defaultdict(list)
+        rows = RecipeIngredient.objects.filter(recipe__in=recipes).values_list(
+            "recipe_id", "ingredient__name"
+        )
+        for recipe_pk, name in rows:
+            ingredients[recipe_pk].append(name)
+        rows = recipes.values_list("pk", "title", "instructions", "category__name")
+        for pk, title, instructions, category in rows:
+            fields = {
+                "title": title,
+                "ingredient": " ".join(ingredients[pk]),
+                "category": category or "",
+                "instructions": instructions,
+            }
+            self._add(pk, fields)
+
+    def _add(self, pk, fields):
+        weights = Counter()
+        for field, text in fields.items():
+            for term, count in Counter(tokenize(text)).items():
+                weights[term] += FIELD_WEIGHTS[field] * (1 + math.log(count))
+        for term, weight in weights.items():
+            self._postings[term][pk] = weight
+        self._terms[pk] = tuple(weights)
+        self._vocabulary = None
+        self._results = {}
+
+    def _remove(self, pk):
+        self._results = {}
+        for term in self._terms.pop(pk, ()):
+            postings = self._postings[term]
+            del postings[pk]
+            if not postings:
+                del self._postings[term]
+                self._vocabulary = None
+
+    def _prefix_postings(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        terms = [
+            term
+            for term in vocabulary[start : start + MAX_EXPANSIONS]
+            if term.startswith(prefix)
+        ]
+        if terms == [prefix]:
+            return self._postings[prefix]
+        merged = {}
+        for term in terms:
+            # Completions count less than the exact word
+            factor = 1 if term == prefix else 0.5
+            for pk, weight in self._postings[term].items():
+                weight *= factor
+                if weight > merged.get(pk, 0):
+                    merged[pk] = weight
+        return merged
+
+    def search(self, query, limit=50):
+        """Return the pks of the best matching recipes, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.ensure_fresh()
+        with self._lock:
+            key = (tuple(terms), limit)
+            if key not in self._results:
+                if len(self._results) >= RESULT_CACHE_SIZE:
+                    self._results.clear()
+                self._results[key] = self._search(terms, limit)
+            return list(self._results[key])
+
+    def _search(self, terms, limit):
+        matches = [self._postings.get(term, {}) for term in terms[:-1]]
+        matches.append(self._prefix_postings(terms[-1]))
+        if not all(matches):
+            return []
+        if len(matches) == 1:
+            # A single term ranks by its weights alone
+            return heapq.nlargest(limit, matches[0], key=matches[0].get)
+        total = len(self._terms)
+        # Start from the rarest term, the candidates only shrink
+        matches.sort(key=len)
+        scores = None
+        for postings in matches:
+            idf = math.log(1 + total / len(postings))
+            if scores is None:
+                scores = {pk: weight * idf for pk, weight in postings.items()}
+                continue
+            scores = {
+                pk: score + postings[pk] * idf
+                for pk, score in scores.items()
+                if pk in postings
+            }
+            if not scores:
+                return []
+        return heapq.nlargest(limit, scores, key=scores.get)
+
+
+index = SearchIndex()
+
+
+def search_recipes(query, limit=50):
+    """Return the best matching Recipe objects, best first, ready to be
+    turned into Drink records."""
+    pks = index.search(query, limit)
+    if not pks:
+        return []
+    recipes = Recipe.objects.select_related("category").prefetch_related(
+        "recipe_ingredients__ingredient"
+    )
+    recipes = recipes.in_bulk(pks)
+    return [recipes[pk] for pk in pks if pk in recipes]
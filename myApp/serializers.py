@@ -1,6 +1,13 @@
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
+
+from . import fragments, pantry
+from .filters import MAX_ID
 from .models import Recipe, RecipeIngredient, Rating, Favorite, Category, Ingredient
 
+# Recipes a batch request may name at most
+BATCH_LIMIT = 100
+
 
 class CategorySerializer(serializers.ModelSerializer):
 
@@ -35,47 +42,177 @@ class RatingSerializer(serializers.ModelSerializer):
         return obj.user.username
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Only serialize the comma-separated fields of `?fields=`, if given."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        fields = request.query_params.get("fields") if request else None
+        if not fields:
+            return
+        wanted = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}."}
+            )
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class RecipeListSerializerMany(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, "all") else data)
+        request = self.context.get("request")
+        if "is_my_favorite" in self.child.fields and request.user.is_authenticated:
+            # One query for the whole page instead of one per recipe
+            self.context["favorite_recipe_ids"] = set(
+                Favorite.objects.filter(
+                    user=request.user, recipe__in=recipes
+                ).values_list("recipe_id", flat=True)
+            )
+        # One cache round trip for the whole page
+        self.context["fragments"] = self.child.get_fragments(recipes)
+        return super().to_representation(recipes)
+
+
+class RecipeListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """The recipe cards of list responses.
+
+    Everything but the `per_request_fields` is served from the fragments
+    cached per recipe (myApp/fragments.py), built by the serializer itself
+    on misses.
+    """
+
+    fragment_name = "card"
+    # Depend on the user or on other recipes
+    per_request_fields = ("is_my_favorite",)
+
     category = CategorySerializer(read_only=True)
-    # recipe_ingredients is the related_name for
-    # recipe foreinkey in RecipeIngredient Model
-    recipe_ingredients = RecipeIngredientSerializer(many=True, read_only=True)
-    ratings = RatingSerializer(read_only=True, many=True)
-    average_rate = serializers.SerializerMethodField()
-    number_of_rates = serializers.SerializerMethodField()
+    # Stored on the recipe, see myApp/ratings.py
+    average_rate = serializers.ReadOnlyField(source="rating_average")
+    number_of_rates = serializers.ReadOnlyField(source="rating_count")
     is_my_favorite = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializerMany
         fields = [
             "id",
             "recipe_id",
             "title",
-            "instructions",
             "picture_url",
             "is_my_favorite",
             "number_of_rates",
             "average_rate",
             "category",
-            "recipe_ingredients",
-            "ratings",
         ]
 
-    def get_average_rate(self, obj):
-        return obj.get_average_rating()
-
-    def get_number_of_rates(self, obj):
-        return obj.get_rates_number()
+    def to_representation(self, instance):
+        if self.context.get("building_fragments"):
+            return super().to_representation(instance)
+        fragment = self.context.get("fragments", {}).get(instance.pk)
+        if fragment is None:
+            fragment = self.get_fragments([instance])[instance.pk]
+        return {
+            name: (
+                field.to_representation(field.get_attribute(instance))
+                if name in self.per_request_fields
+                else fragment[name]
+            )
+            for name, field in self.fields.items()
+        }
+
+    def get_fragments(self, recipes):
+        return fragments.get_fragments(
+            recipes, self.fragment_name, self.build_fragments
+        )
+
+    def prepare_fragments(self, recipes):
+        """Load what building the fragments of `recipes` needs."""
+        prefetch_related_objects(recipes, "category")
+
+    def build_fragments(self, recipes):
+        self.prepare_fragments(recipes)
+        builder = type(self)(context={"building_fragments": True})
+        for name in self.per_request_fields:
+            builder.fields.pop(name)
+        return {recipe.pk: builder.to_representation(recipe) for recipe in recipes}
 
     def get_is_my_favorite(self, obj):
+        favorite_recipe_ids = self.context.get("favorite_recipe_ids")
+        if favorite_recipe_ids is not None:
+            return obj.pk in favorite_recipe_ids
         user = self.context.get("request").user
         if user.is_authenticated:
             return obj.favorites.filter(user=user).exists()
         return False
 
 
+class RecipeSerializer(RecipeListSerializer):
+    # recipe_ingredients is the related_name for
+    # recipe foreinkey in RecipeIngredient Model
+    recipe_ingredients = RecipeIngredientSerializer(many=True, read_only=True)
+    similar_drinks = serializers.SerializerMethodField()
+
+    fragment_name = "detail"
+    per_request_fields = ("is_my_favorite", "similar_drinks")
+
+    class Meta(RecipeListSerializer.Meta):
+        # Ratings are served by /recipes/<pk>/ratings/, paginated
+        fields = [
+            "id",
+            "recipe_id",
+            "title",
+            "instructions",
+            "picture_url",
+            "is_my_favorite",
+            "number_of_rates",
+            "average_rate",
+            "category",
+            "recipe_ingredients",
+            "similar_drinks",
+        ]
+
+    def get_similar_drinks(self, obj):
+        # Follows the other recipes' changes, see PantryIndex.similar()
+        return [
+            {"id": pk, "score": round(score, 4)}
+            for pk, score in pantry.index.similar(obj.pk, pantry.SIMILAR_DRINKS)
+        ]
+
+    def prepare_fragments(self, recipes):
+        prefetch_related_objects(recipes, "category", "recipe_ingredients__ingredient")
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Favorite
         fields = ["id", "user", "recipe", "created_at"]
+
+
+class FavoriteBatchSerializer(serializers.Serializer):
+    """Recipe ids to add to and remove from the user's favorites."""
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_ID),
+        max_length=BATCH_LIMIT,
+        default=list,
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_ID),
+        max_length=BATCH_LIMIT,
+        default=list,
+    )
+
+    def validate(self, data):
+        if not data["add"] and not data["remove"]:
+            raise serializers.ValidationError("Nothing to add or remove.")
+        both = set(data["add"]) & set(data["remove"])
+        if both:
+            raise serializers.ValidationError(
+                {"remove": f"Also in add: {', '.join(map(str, sorted(both)))}."}
+            )
+        return data
@@ -0,0 +1,120 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .models import Favorite, Rating, Recipe, RecipeIngredient
+from .ratings import RATING_FIELDS, apply_rating_delta, recompute_rating_stats
+from .versions import bump_favorites_version
+
+# Sent with `recipe_pks` when recipes were created or changed in this process
+recipes_changed = Signal()
+
+# Version tokens of the catalog in the shared cache, other processes poll
+# them to notice changes (see myApp/indexes.py)
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_EPOCH_KEY = "catalog:epoch"
+
+_state = threading.local()
+
+
+def catalog_state():
+    state = cache.get_many([CATALOG_VERSION_KEY, CATALOG_EPOCH_KEY])
+    return state.get(CATALOG_VERSION_KEY), state.get(CATALOG_EPOCH_KEY)
+
+
+def catalog_changed(recipe_pks, deleted=False):
+    """Tell the in-process indexes and the other workers about changes.
+
+    Bulk writes (CatalogWriter) don't send model signals and call this
+    directly.
+    """
+    recipe_pks = set(recipe_pks)
+    recipes_changed.send(sender=Recipe, recipe_pks=recipe_pks)
+    key = CATALOG_EPOCH_KEY if deleted else CATALOG_VERSION_KEY
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+@contextmanager
+def bulk_catalog_write():
+    """Skip the per-row RecipeIngredient receivers in this thread, the
+    caller calls catalog_changed() once for the whole write."""
+    previous = getattr(_state, "bulk_write", False)
+    _state.bulk_write = True
+    try:
+        yield
+    finally:
+        _state.bulk_write = previous
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        catalog_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    catalog_changed([instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, raw=False, **kwargs):
+    if raw or getattr(_state, "bulk_write", False):
+        return
+    # Other workers pick up changed recipes by updated_at
+    Recipe.objects.filter(pk=instance.recipe_id).update(updated_at=timezone.now())
+    catalog_changed([instance.recipe_id])
+
+
+def refresh_rating_stats(rating):
+    # Keep a recipe object attached to the rating in step with the database
+    if Rating.recipe.is_cached(rating):
+        try:
+            rating.recipe.refresh_from_db(fields=RATING_FIELDS)
+        except Recipe.DoesNotExist:
+            # Deleted along with its ratings
+            pass
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rate = Decimal(str(instance.rate))
+    stored = getattr(instance, "_stored", None)
+    if created:
+        apply_rating_delta(instance.recipe_id, 1, rate)
+    elif stored is None:
+        # Updated without being loaded first, the old rate is unknown
+        recompute_rating_stats([instance.recipe_id])
+    elif stored[0] == instance.recipe_id:
+        apply_rating_delta(instance.recipe_id, 0, rate - stored[1])
+    else:
+        apply_rating_delta(stored[0], -1, -stored[1])
+        apply_rating_delta(instance.recipe_id, 1, rate)
+    instance._stored = (instance.recipe_id, rate)
+    refresh_rating_stats(instance)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    stored = getattr(
+        instance, "_stored", (instance.recipe_id, Decimal(str(instance.rate)))
+    )
+    apply_rating_delta(stored[0], -1, -stored[1])
+    refresh_rating_stats(instance)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_favorites_version(instance.user_id)
@@ -0,0 +1,213 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import ingest, recommend
+from .cocktaildb import get_client
+from .models import Job, Recipe
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Run jobs inline when they are enqueued, for tests and development
+    "EAGER": False,
+    # Threads of a `run_tasks` worker
+    "WORKERS": 4,
+    "MAX_ATTEMPTS": 3,
+    # Seconds before the first retry, doubled after each failed attempt
+    "RETRY_DELAY": 10,
+    # Running jobs older than this are considered lost by their worker
+    "TIMEOUT": 300,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "TASKS", {}).get(name, DEFAULTS[name])
+
+
+registry = {}
+
+
+class JobFailed(Exception):
+    """Raised by a task to fail its job without retrying it."""
+
+
+def task(name=None, max_attempts=None):
+    """Register a function as a task, enqueued by name with JSON kwargs.
+
+    Tasks may run more than once (retries, lost workers), they have to be
+    idempotent.
+    """
+
+    def register(func):
+        func.task_name = name or func.__name__
+        func.max_attempts = max_attempts
+        registry[func.task_name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, key="", **kwargs):
+    """Store a job running task `name` with `kwargs`, return the Job.
+
+    A job enqueued with the `key` of a pending job is not stored again, the
+    pending one is returned. Jobs are part of the current transaction, a
+    rollback drops them too.
+    """
+    func = registry[name]
+    job = Job(
+        name=name,
+        kwargs=kwargs,
+        key=key,
+        max_attempts=func.max_attempts or get_setting("MAX_ATTEMPTS"),
+    )
+    if key:
+        pending = Job.objects.filter(key=key, status=Job.PENDING).first()
+        if pending is not None:
+            return pending
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            # Enqueued concurrently
+            return Job.objects.filter(key=key, status=Job.PENDING).first() or job
+    else:
+        job.save()
+    if get_setting("EAGER"):
+        job.attempts += 1
+        job.status = Job.RUNNING
+        job.started_at = timezone.now()
+        run(job)
+    return job
+
+
+def claim(limit):
+    """Mark up to `limit` due pending jobs as running and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.PENDING, run_after__lte=now)
+            .order_by("run_after", "pk")[:limit]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, started_at=now, attempts=F("attempts") + 1
+        )
+    for job in jobs:
+        job.status = Job.RUNNING
+        job.started_at = now
+        job.attempts += 1
+    return jobs
+
+
+def finish(job, error=None, duration=None, retry=True):
+    """Record the outcome of a job attempt, retrying failures with backoff."""
+    now = timezone.now()
+    job.finished_at = now
+    job.duration = duration
+    if error is None:
+        job.status = Job.DONE
+        job.error = ""
+    elif retry and job.attempts < job.max_attempts:
+        job.status = Job.PENDING
+        job.error = error
+        delay = get_setting("RETRY_DELAY") * 2 ** (job.attempts - 1)
+        job.run_after = now + timedelta(seconds=delay)
+    else:
+        job.status = Job.FAILED
+        job.error = error
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # The same work was enqueued again meanwhile, that job covers it
+        job.status = Job.FAILED
+        job.save()
+
+
+def run(job):
+    """Run a claimed job and record its outcome."""
+    start = time.perf_counter()
+    try:
+        registry[job.name](**job.kwargs)
+    except JobFailed as e:
+        logger.info("Job %s (%s) failed: %s", job.pk, job.name, e)
+        finish(job, str(e), time.perf_counter() - start, retry=False)
+    except Exception as e:
+        logger.warning(
+            "Job %s (%s) failed, attempt %s of %s",
+            job.pk,
+            job.name,
+            job.attempts,
+            job.max_attempts,
+            exc_info=True,
+        )
+        finish(job, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+    else:
+        finish(job, duration=time.perf_counter() - start)
+    return job
+
+
+def run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        # Worker threads have their own database connections
+        connections.close_all()
+
+
+def requeue_lost(timeout=None):
+    """Count running jobs older than `timeout` seconds as failed attempts,
+    their worker died or hung. Return the number of jobs."""
+    timeout = get_setting("TIMEOUT") if timeout is None else timeout
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    lost = Job.objects.filter(status=Job.RUNNING, started_at__lt=deadline)
+    count = 0
+    for job in lost:
+        finish(job, f"Timed out after {timeout}s")
+        count += 1
+    return count
+
+
+# Tasks
+
+
+@task()
+def update_recommendations(recipe_pk):
+    """Refresh the neighbours of a recipe whose favorites or ratings changed,
+    see recommend.update()."""
+    recommend.update([recipe_pk])
+
+
+@task(max_attempts=5)
+def favorite_drink(user_id, drink_id):
+    """Fetch a drink we don't have from TheCocktailDB, store it and add it
+    to the user's favorites. Lookup errors are retried, a drink missing
+    upstream fails the job."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    recipe_pk = (
+        Recipe.objects.filter(recipe_id=drink_id).values_list("pk", flat=True).first()
+    )
+    if recipe_pk is not None:
+        _, created = ingest.add_favorite(user, recipe_pk)
+    else:
+        drink = get_client().lookup(drink_id)
+        if drink is None:
+            raise JobFailed(f"Drink {drink_id} not found upstream")
+        favorite, created = ingest.favorite_drink(user, drink)
+        recipe_pk = favorite.recipe_id
+    if created:
+        enqueue(
+            "update_recommendations",
+            key=f"update_recommendations:{recipe_pk}",
+            recipe_pk=recipe_pk,
+        )
@@ -1,7 +1,19 @@
+import base64
+import json
+
 import pytest
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from myApp.models import Favorite
+from myApp import fragments, pantry
+from myApp.cache_backends import TieredCache
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
+from myApp.models import Favorite, Ingredient, Rating, Recipe, RecipeIngredient
+from myApp.serializers import RecipeListSerializer, RecipeSerializer
 
 
 @pytest.mark.django_db
@@ -44,3 +56,346 @@ class TestRecipeAPI:
         response = api_client.post(url)
         assert response.status_code == status.HTTP_200_OK
         assert not Favorite.objects.filter(user=user, recipe=recipe).exists()
+
+    def test_status_requires_staff(self, api_client, user):
+        url = reverse("api:status")
+        api_client.force_authenticate(user=user)
+        assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["cocktaildb"]["breaker"]["state"] == "closed"
+        assert "stale" in response.data["cache"]
+
+
+@pytest.mark.django_db
+class TestRecipeSerializers:
+
+    def make_recipes(self, count):
+        return CatalogWriter().write(
+            [
+                Drink(id=i, title=f"Drink {i}", ingredients=(("Gin", "1 oz"),))
+                for i in range(1, count + 1)
+            ]
+        )
+
+    def test_list_is_light_and_detail_is_full(self, api_client, recipe):
+        list_item = api_client.get(reverse("api:recipes-list")).data["results"][0]
+        detail = api_client.get(
+            reverse("api:recipes-detail", kwargs={"pk": recipe.pk})
+        ).data
+
+        assert "recipe_ingredients" not in list_item
+        assert "ratings" not in list_item and "ratings" not in detail
+        assert detail["recipe_ingredients"][0]["ingredient"]["name"] == "Lemon"
+        assert detail["instructions"] == "Mix it."
+
+    def test_sparse_fieldsets(self, api_client, recipe):
+        url = reverse("api:recipes-list")
+
+        response = api_client.get(url, {"fields": "id,title"})
+        assert response.data["results"] == [{"id": recipe.pk, "title": "Test Drink"}]
+
+        response = api_client.get(url, {"fields": "id,secret"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_is_my_favorite_costs_one_query_per_page(self, api_client, user):
+        pks = self.make_recipes(4)
+        Favorite.objects.create(user=user, recipe_id=pks[2])
+        api_client.force_authenticate(user=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("api:recipes-list"), {"page_size": 2})
+
+        flags = {r["id"]: r["is_my_favorite"] for r in response.data["results"]}
+        assert flags == {pks[1]: False, pks[2]: True}
+        favorite_queries = [q for q in queries if "myApp_favorite" in q["sql"]]
+        assert len(favorite_queries) == 1
+
+    def test_ratings_sub_resource(self, api_client, recipe, user):
+        Rating.objects.create(recipe=recipe, user=user, rate=4, review="Nice")
+        for i in range(2):
+            other = User.objects.create_user(username=f"rater{i}")
+            Rating.objects.create(recipe=recipe, user=other, rate=3)
+        url = reverse("api:recipes-ratings", kwargs={"pk": recipe.pk})
+
+        response = api_client.get(url, {"page_size": 2})
+
+        assert response.data["count"] == 3
+        assert len(response.data["results"]) == 2
+        assert api_client.get(response.data["next"]).data["results"][0]["review"] == (
+            "Nice"
+        )
+        missing = reverse("api:recipes-ratings", kwargs={"pk": recipe.pk + 1})
+        assert api_client.get(missing).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestRecipePagination:
+
+    def walk(self, api_client, params):
+        url, seen = reverse("api:recipes-list"), []
+        response = api_client.get(url, params)
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            seen += [r["id"] for r in response.data["results"]]
+            if not response.data["next"]:
+                return seen
+            response = api_client.get(response.data["next"])
+
+    def test_walks_every_ordering(self, api_client, user):
+        pks = CatalogWriter().write(
+            [Drink(id=i, title=f"Drink {i}") for i in range(1, 8)]
+        )
+        # Ties on the average are broken by id
+        for recipe_id, rate in [(2, 5), (3, 2), (4, 5), (6, 4)]:
+            Rating.objects.create(recipe_id=pks[recipe_id], user=user, rate=rate)
+        by_rating = [pks[i] for i in (4, 2, 6, 3, 7, 5, 1)]
+
+        assert self.walk(api_client, {"page_size": 3}) == sorted(pks.values())
+        assert self.walk(api_client, {"ordering": "-id", "page_size": 2}) == sorted(
+            pks.values(), reverse=True
+        )
+        assert self.walk(api_client, {"ordering": "-rating", "page_size": 2}) == (
+            by_rating
+        )
+        assert self.walk(api_client, {"ordering": "rating"}) == by_rating[::-1]
+
+    def test_search_results_keep_their_rank(self, api_client):
+        pks = CatalogWriter().write(
+            [
+                Drink(id=1, title="Gin Fizz", instructions="Shake with lemon."),
+                Drink(id=2, title="Lemon Drop"),
+                Drink(id=3, title="Lemon Lime", ingredients=(("Lemon", ""),)),
+            ]
+        )
+
+        seen = self.walk(api_client, {"search": "lemon", "page_size": 1})
+
+        assert seen == [pks[3], pks[2], pks[1]]
+
+    def test_search_without_hits_orders_by_rank(self, api_client, recipe):
+        url = reverse("api:recipes-list")
+        response = api_client.get(url, {"search": "nothing", "ordering": "rank"})
+
+        assert response.status_code == 200
+        assert response.data["results"] == []
+
+    def test_page_size_count_and_errors(self, api_client, recipe):
+        url = reverse("api:recipes-list")
+
+        response = api_client.get(url, {"page_size": 1000, "count": "false"})
+        assert "count" not in response.data
+        assert len(response.data["results"]) == 1
+
+        assert api_client.get(url, {"cursor": "bad"}).status_code == 404
+        # Well-formed cursors with values of the wrong type
+        for ordering, values in [
+            ("id", ["abc"]),
+            ("id", [None]),
+            ("rating", ["x", 1]),
+            ("-rating", [{}, 1]),
+        ]:
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            params = {"ordering": ordering, "cursor": cursor}
+            assert api_client.get(url, params).status_code == 404
+        ratings = reverse("api:recipes-ratings", kwargs={"pk": recipe.pk})
+        cursor = base64.urlsafe_b64encode(b'["yesterday", 1]').decode()
+        assert api_client.get(ratings, {"cursor": cursor}).status_code == 404
+        assert api_client.get(url, {"ordering": "title"}).status_code == 400
+        assert api_client.get(url, {"ordering": "rank"}).status_code == 400
+
+
+def not_serialized(*args, **kwargs):
+    raise AssertionError("A 304 shouldn't serialize anything")
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+
+    def revalidate(self, api_client, url, response, params=None):
+        return api_client.get(url, params, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_detail_changes_with_the_recipe_and_favorites(
+        self, api_client, user, recipe, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        api_client.force_authenticate(user=user)
+        url = reverse("api:recipes-detail", kwargs={"pk": recipe.pk})
+        response = api_client.get(url)
+        assert response["Last-Modified"]
+
+        with monkeypatch.context() as patch:
+            patch.setattr(RecipeSerializer, "to_representation", not_serialized)
+            not_modified = self.revalidate(api_client, url, response)
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not_modified["ETag"] == response["ETag"]
+
+        Rating.objects.create(recipe=recipe, user=user, rate=4)
+        response = self.revalidate(api_client, url, response)
+        assert response.data["number_of_rates"] == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Favorite.objects.create(user=user, recipe=recipe)
+        response = self.revalidate(api_client, url, response)
+        assert response.data["is_my_favorite"] is True
+
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=Ingredient.objects.create(name="Gin"), order=2
+        )
+        response = self.revalidate(api_client, url, response)
+        assert len(response.data["recipe_ingredients"]) == 2
+
+        assert self.revalidate(api_client, url, response).status_code == 304
+        missing = reverse("api:recipes-detail", kwargs={"pk": recipe.pk + 1})
+        assert api_client.get(missing).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_etag_follows_the_page_items(self, api_client, user, monkeypatch):
+        pks = CatalogWriter().write(
+            [Drink(id=i, title=f"Drink {i}") for i in range(1, 4)]
+        )
+        url, params = reverse("api:recipes-list"), {"page_size": 2}
+        response = api_client.get(url, params)
+
+        # A recipe of another page doesn't change this one
+        Rating.objects.create(recipe_id=pks[3], user=user, rate=5)
+        with monkeypatch.context() as patch:
+            patch.setattr(RecipeListSerializer, "to_representation", not_serialized)
+            not_modified = self.revalidate(api_client, url, response, params)
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+        Rating.objects.create(recipe_id=pks[2], user=user, rate=5)
+        response = self.revalidate(api_client, url, response, params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][1]["average_rate"] == 5
+
+        # Another user or format gets another tag
+        api_client.force_authenticate(user=user)
+        assert self.revalidate(api_client, url, response, params).status_code == 200
+
+
+@pytest.mark.django_db
+class TestRecipeFragments:
+
+    @pytest.fixture(autouse=True)
+    def fresh_stats(self):
+        fragments.stats.reset()
+
+    def test_detail_served_from_fragment(self, api_client, user, recipe):
+        url = reverse("api:recipes-detail", kwargs={"pk": recipe.pk})
+        first = api_client.get(url).data
+
+        api_client.force_authenticate(user=user)
+        Favorite.objects.create(user=user, recipe=recipe)
+        with CaptureQueriesContext(connection) as queries:
+            second = api_client.get(url).data
+
+        assert second == {**first, "is_my_favorite": True}
+        assert not [q for q in queries if "myApp_recipeingredient" in q["sql"]]
+        assert fragments.stats.snapshot()["hits"] == 1
+
+    def test_changes_rebuild_the_fragment(
+        self, api_client, user, recipe, django_capture_on_commit_callbacks
+    ):
+        url = reverse("api:recipes-list")
+        api_client.get(url)
+        generation = caches["shared"].get(TieredCache.GENERATION_KEY)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Rating.objects.create(recipe=recipe, user=user, rate=4)
+        card = api_client.get(url, {"fields": "id,number_of_rates"}).data["results"]
+
+        assert card == [{"id": recipe.pk, "number_of_rates": 1}]
+        assert fragments.stats.snapshot()["misses"] == 2
+        # Outdated fragments aren't deleted, which would drop the in-process
+        # cache of every worker
+        assert caches["shared"].get(TieredCache.GENERATION_KEY) == generation
+
+    def test_list_reports_hit_ratio(self, api_client, user):
+        CatalogWriter().write([Drink(id=i, title=f"Drink {i}") for i in range(4)])
+        url = reverse("api:recipes-list")
+        api_client.get(url, {"page_size": 2})
+        api_client.get(url)
+
+        user.is_staff = True
+        user.save()
+        api_client.force_authenticate(user=user)
+        report = api_client.get(reverse("api:status")).data["fragments"]
+
+        assert (report["hits"], report["misses"]) == (2, 4)
+        assert report["hit_ratio"] == pytest.approx(1 / 3, abs=1e-3)
+        assert report["saved_seconds"] > 0
+
+
+@pytest.mark.django_db
+class TestBatchEndpoints:
+
+    def test_batch_retrieve(self, api_client, user):
+        pks = CatalogWriter().write(
+            [
+                Drink(id=i, title=f"Drink {i}", ingredients=(("Gin", "1 oz"),))
+                for i in range(1, 6)
+            ]
+        )
+        Favorite.objects.create(user=user, recipe_id=pks[4])
+        api_client.force_authenticate(user=user)
+        url = reverse("api:recipes-batch")
+        ids = [pks[4], 999, pks[1], pks[4]]
+        # Built on first use, for similar_drinks
+        pantry.index.ensure_fresh()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, {"ids": ",".join(map(str, ids))})
+
+        assert [r["id"] for r in response.data["results"]] == [pks[4], pks[1]]
+        assert response.data["results"][0]["is_my_favorite"] is True
+        assert response.data["results"][1]["recipe_ingredients"]
+        assert response.data["missing"] == [999]
+        # Recipes, favorite flags, recipe ingredients and their ingredients
+        assert len(queries) == 4
+        for invalid in ["1,x", "1,0", "-1", str(2**31), str(2**64)]:
+            assert api_client.get(url, {"ids": invalid}).status_code == 400
+        assert api_client.get(url).status_code == 400
+
+    def test_batch_favorite(
+        self, api_client, user, recipe, django_capture_on_commit_callbacks
+    ):
+        url = reverse("api:recipes-batch-favorite")
+        assert api_client.post(url, {"add": [recipe.pk]}).status_code == 401
+
+        api_client.force_authenticate(user=user)
+        other = Recipe.objects.create(recipe_id=1, title="Other")
+        Favorite.objects.create(user=user, recipe=other)
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            response = api_client.post(
+                url,
+                {"add": [recipe.pk, other.pk, 999], "remove": [other.pk + 1]},
+                format="json",
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["add"] == [
+            {"id": recipe.pk, "status": "added"},
+            {"id": other.pk, "status": "already_favorite"},
+            {"id": 999, "status": "not_found"},
+        ]
+        assert response.data["remove"] == [{"id": other.pk + 1, "status": "not_found"}]
+        # The favorites version was bumped
+        assert callbacks
+
+        response = api_client.post(
+            url, {"remove": [recipe.pk, other.pk]}, format="json"
+        )
+        assert [r["status"] for r in response.data["remove"]] == ["removed"] * 2
+        assert not Favorite.objects.filter(user=user).exists()
+
+        for invalid in [
+            {},
+            {"add": [1], "remove": [1]},
+            {"add": ["x"]},
+            {"add": [2**64]},
+            {"remove": [0]},
+        ]:
+            response = api_client.post(url, invalid, format="json")
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
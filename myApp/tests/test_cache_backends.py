@@ -0,0 +1,157 @@
+import os
+import uuid
+from io import StringIO
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from myApp.cache_backends import TieredCache
+
+
+@pytest.fixture
+def tiered(settings):
+    # Each test gets its own L1 store and shared tier
+    l2 = f"l2-{uuid.uuid4().hex}"
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        l2: {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": l2,
+        },
+        "tiered": {
+            "BACKEND": "myApp.cache_backends.TieredCache",
+            "LOCATION": l2,
+            "OPTIONS": {"MAX_ENTRIES": 3, "MAX_BYTES": 4096, "SYNC_INTERVAL": 0},
+        },
+    }
+    return caches["tiered"]
+
+
+class TestTieredCache:
+
+    def test_hot_keys_are_served_from_l1(self, tiered):
+        tiered.set("drink", {"name": "Mojito"})
+        tiered.l2.set("drink", {"name": "changed elsewhere"})
+
+        assert tiered.get("drink") == {"name": "Mojito"}
+        assert tiered.get_stats()["hits"] == 1
+
+    def test_l1_is_filled_from_l2(self, tiered):
+        tiered.l2.set("drink", "Mojito")
+
+        assert tiered.get("drink") == "Mojito"
+        assert tiered.get("drink") == "Mojito"
+        stats = tiered.get_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert tiered.get("missing", "default") == "default"
+
+    def test_entry_and_byte_limits_evict_lru(self, tiered):
+        for key in "abcd":
+            tiered.set(key, key)
+        assert tiered.get_stats()["entries"] == 3
+        assert tiered.get_stats()["evictions"] == 1
+
+        tiered.set("big", "x" * 4000)
+        stats = tiered.get_stats()
+        assert stats["bytes"] <= 4096
+        assert stats["evictions"] > 1
+        # Entries larger than the whole L1 only live in L2
+        tiered.set("huge", "x" * 5000)
+        assert tiered.get("huge") == "x" * 5000
+
+    def test_delete_elsewhere_invalidates_l1(self, tiered):
+        tiered.set("drink", "Mojito")
+        tiered.get("drink")
+
+        # Another worker deletes the key and bumps the generation
+        tiered.l2.delete("drink")
+        tiered.l2.set(TieredCache.GENERATION_KEY, "other-worker", None)
+
+        assert tiered.get("drink") is None
+        assert tiered.get_stats()["invalidations"] >= 1
+
+    def test_bypassed_keys_always_hit_l2(self, tiered):
+        tiered.set("throttle_user_1", [1, 2])
+        tiered.l2.set("throttle_user_1", [1, 2, 3])
+
+        assert tiered.get("throttle_user_1") == [1, 2, 3]
+        assert tiered.get_stats()["entries"] == 0
+
+
+@pytest.fixture
+def sqlite_cache(settings, tmp_path):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "file": {
+            "BACKEND": "myApp.cache_backends.SQLiteCache",
+            "LOCATION": str(tmp_path / "cache.sqlite3"),
+            "OPTIONS": {"MAX_BYTES": 20_000, "STATS_INTERVAL": 0},
+        },
+    }
+    return caches["file"]
+
+
+class TestSQLiteCache:
+
+    def test_roundtrip_and_compression(self, sqlite_cache):
+        drinks = [{"strDrink": "Margarita", "strInstructions": "Shake. " * 300}]
+        sqlite_cache.set("search_res_margarita", drinks, 60)
+
+        assert sqlite_cache.get("search_res_margarita") == drinks
+        assert sqlite_cache.get_many(["search_res_margarita", "nope"]) == {
+            "search_res_margarita": drinks
+        }
+        # The repeated instructions compress well below their pickled size
+        assert sqlite_cache.report()["bytes"] < 300
+
+    def test_add_delete_and_expiry(self, sqlite_cache):
+        assert sqlite_cache.add("lock", "a", 60)
+        assert not sqlite_cache.add("lock", "b", 60)
+        assert sqlite_cache.delete("lock")
+        assert sqlite_cache.add("lock", "b", 60)
+
+        sqlite_cache.set("gone", 1, -1)
+        assert not sqlite_cache.has_key("gone")
+        assert sqlite_cache.report()["bytes"] == len(
+            sqlite_cache.make_key("lock")
+        ) + len(sqlite_cache._encode("b"))
+
+    def test_size_bound_evicts_least_recently_used(self, sqlite_cache):
+        for i in range(10):
+            sqlite_cache.set(f"key{i}", os.urandom(3000), 60)
+
+        report = sqlite_cache.report(top=3)
+        assert report["bytes"] <= 20_000
+        assert report["evictions"] > 0
+        assert not sqlite_cache.has_key("key0")
+        assert sqlite_cache.has_key("key9")
+        assert len(report["largest"]) == 3
+
+    def test_bulk_reads_and_touches_count_as_use(self, sqlite_cache):
+        sqlite_cache._touch_interval = 0
+        for i in range(5):
+            sqlite_cache.set(f"key{i}", os.urandom(3000), 60)
+        sqlite_cache.get_many(["key0"])
+        sqlite_cache.touch("key1", 60)
+
+        for i in range(5, 8):
+            sqlite_cache.set(f"key{i}", os.urandom(3000), 60)
+
+        assert sqlite_cache.has_key("key0")
+        assert sqlite_cache.has_key("key1")
+        assert not sqlite_cache.has_key("key2")
+
+    def test_cache_stats_command(self, sqlite_cache):
+        sqlite_cache.set("search_res_mojito", ["Mojito"], 60)
+        sqlite_cache.get("search_res_mojito")
+        sqlite_cache.get("search_res_gimlet")
+
+        out = StringIO()
+        call_command("cache_stats", "--alias", "file", stdout=out)
+
+        assert "hit rate: 50.0% (1 hits, 1 misses)" in out.getvalue()
+        assert "search_res_mojito" in out.getvalue()
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from django.core.cache import cache, caches
+from myApp import caching
+
+
+@pytest.mark.django_db
+class TestSingleFlight:
+
+    def test_miss_fetches_and_caches(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "fresh"
+
+        assert caching.single_flight("sf_key", fetch, 60) == "fresh"
+        assert caching.single_flight("sf_key", fetch, 60) == "fresh"
+        assert len(calls) == 1
+        assert cache.get("sf_key:lock") is None
+
+    def test_stale_value_is_served_while_refreshing(self, monkeypatch):
+        monkeypatch.setattr(caching, "BACKGROUND_REFRESH", False)
+        caching.single_flight("sf_key", lambda: "old", 0, stale_timeout=60)
+
+        assert caching.single_flight("sf_key", lambda: "new", 60) == "old"
+        assert caching.single_flight("sf_key", lambda: "newer", 60) == "new"
+
+    def test_stale_value_survives_upstream_errors(self, monkeypatch):
+        monkeypatch.setattr(caching, "BACKGROUND_REFRESH", False)
+        caching.single_flight("sf_key", lambda: "old", 0, stale_timeout=60)
+
+        def fetch():
+            raise RuntimeError("upstream is down")
+
+        before = caching.stats.snapshot()
+        assert caching.single_flight("sf_key", fetch, 60) == "old"
+        assert caching.single_flight("sf_key", fetch, 60) == "old"
+        after = caching.stats.snapshot()
+        assert after["stale"] - before["stale"] == 2
+        assert after["refresh_errors"] - before["refresh_errors"] == 2
+
+    def test_refresh_in_progress_serves_stale_value(self):
+        caching.single_flight("sf_key", lambda: "old", 0, stale_timeout=60)
+        cache.add("sf_key:lock", "someone-else", 60)
+
+        def fetch():
+            raise AssertionError("only the lock holder may fetch")
+
+        assert caching.single_flight("sf_key", fetch, 60) == "old"
+
+    def test_outdated_local_copy_does_not_refetch(self, monkeypatch):
+        monkeypatch.setattr(caching, "BACKGROUND_REFRESH", False)
+        caching.single_flight("sf_key", lambda: "old", 0, stale_timeout=60)
+        # Another worker refreshed the shared tier, this worker's L1 still
+        # holds the stale entry
+        caches["shared"].set("sf_key", ("new", time.time() + 60), 120)
+
+        def fetch():
+            raise AssertionError("already refreshed by another worker")
+
+        assert caching.single_flight("sf_key", fetch, 60) == "old"
+        assert caching.single_flight("sf_key", fetch, 60) == "new"
+        assert cache.get("sf_key:lock") is None
+
+    def test_waiter_gives_up_when_refresh_fails(self, monkeypatch):
+        monkeypatch.setattr(caching, "WAIT_TIMEOUT", 0.2)
+        cache.add("sf_key:lock", "someone-else", 60)
+
+        def fetch():
+            raise AssertionError("only the lock holder may fetch")
+
+        assert caching.single_flight("sf_key", fetch, 60, default="none") == "none"
+
+    def test_none_is_not_cached(self):
+        assert caching.single_flight("sf_key", lambda: None, 60) is None
+        assert caching.single_flight("sf_key", lambda: "later", 60) == "later"
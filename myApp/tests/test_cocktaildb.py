@@ -0,0 +1,83 @@
+import pytest
+from myApp import cocktaildb
+from myApp.drinks import Drink
+
+
+class TestCircuitBreaker:
+
+    @pytest.fixture
+    def client(self, settings):
+        settings.COCKTAILDB = {"BREAKER_THRESHOLD": 2, "BREAKER_RESET_TIMEOUT": 0}
+        client = cocktaildb.LocalCocktailDBClient(
+            drinks=[{"idDrink": "1", "strDrink": "Mojito"}]
+        )
+        return client
+
+    def test_opens_after_consecutive_failures(self, client, monkeypatch):
+        client.breaker.reset_timeout = 60
+
+        def fail(endpoint, params):
+            raise ValueError("bad json")
+
+        monkeypatch.setattr(client, "_request", fail)
+        for _ in range(2):
+            with pytest.raises(cocktaildb.CocktailDBError):
+                client.search("mojito")
+
+        monkeypatch.undo()
+        with pytest.raises(cocktaildb.CircuitOpenError):
+            client.search("mojito")
+        assert client.breaker.snapshot()["state"] == "open"
+        assert client.metrics.snapshot()["search.php"]["calls"] == 2
+
+    def test_successful_probe_closes_the_circuit(self, client, monkeypatch):
+        def fail(endpoint, params):
+            raise ValueError("bad json")
+
+        monkeypatch.setattr(client, "_request", fail)
+        for _ in range(2):
+            with pytest.raises(cocktaildb.CocktailDBError):
+                client.search("mojito")
+        assert client.breaker.state == "open"
+
+        monkeypatch.undo()
+        # The reset timeout is 0 so the next call is the probe
+        assert client.search("mojito")[0].title == "Mojito"
+        assert client.breaker.snapshot()["state"] == "closed"
+
+
+class TestDrink:
+
+    def test_from_api_packs_ingredients_and_drops_nulls(self):
+        data = {
+            "idDrink": "11007",
+            "strDrink": "Margarita",
+            "strDrinkAlternate": None,
+            "strCategory": "Ordinary Drink",
+            "strInstructions": "Rub the rim of the glass with lime.",
+            "strInstructionsDE": None,
+            "strDrinkThumb": "http://img.com/margarita.jpg",
+            "strIngredient1": "Tequila",
+            "strMeasure1": "1 1/2 oz ",
+            "strIngredient2": "Salt",
+            "strMeasure2": None,
+            "strIngredient3": None,
+            "strMeasure3": None,
+        }
+
+        drink = Drink.from_api(data)
+
+        assert drink.id == 11007
+        assert drink.title == "Margarita"
+        assert drink.ingredients == (("Tequila", "1 1/2 oz"), ("Salt", ""))
+
+    def test_client_returns_drinks(self):
+        client = cocktaildb.LocalCocktailDBClient(
+            drinks=[{"idDrink": "1", "strDrink": "Mojito", "strIngredient1": "Rum"}]
+        )
+
+        assert client.search("moj") == [
+            Drink(id=1, title="Mojito", ingredients=(("Rum", ""),))
+        ]
+        assert client.lookup(1).title == "Mojito"
+        assert client.lookup(2) is None
@@ -0,0 +1,92 @@
+import csv
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from myApp import export
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
+from myApp.models import Favorite, Rating
+
+
+@pytest.mark.django_db
+class TestExport:
+
+    @pytest.fixture
+    def pks(self):
+        return CatalogWriter().write(
+            [
+                Drink(
+                    id=i,
+                    title=f"Drink {i}",
+                    category="Cocktail",
+                    instructions="Stir,\nthen pour.",
+                    ingredients=(("Gin", "1 oz"), (f"Bitters {i}", "")),
+                )
+                for i in range(1, 8)
+            ]
+        )
+
+    def test_rows_are_read_in_chunks(self, pks, user):
+        Rating.objects.create(recipe_id=pks[2], user=user, rate=4)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export.iter_rows(export.catalog(), chunk_size=3))
+
+        assert [row["recipe_id"] for row in rows] == list(range(1, 8))
+        assert rows[1]["rating_count"] == 1
+        assert rows[1]["category"] == "Cocktail"
+        assert rows[1]["ingredients"] == [
+            {"name": "Gin", "amount": "1 oz"},
+            {"name": "Bitters 2", "amount": ""},
+        ]
+        # The recipes, and the ingredients of each of the 3 chunks
+        assert len(queries) == 4
+
+    def test_streams_catalog_and_favorites(self, api_client, pks, user):
+        url = reverse("api:export", kwargs={"kind": "recipes", "fmt": "ndjson"})
+        response = api_client.get(url)
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert [json.loads(line)["title"] for line in lines][:2] == [
+            "Drink 1",
+            "Drink 2",
+        ]
+
+        url = reverse("api:export", kwargs={"kind": "favorites", "fmt": "csv"})
+        assert api_client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+        Favorite.objects.create(user=user, recipe_id=pks[3])
+        api_client.force_authenticate(user=user)
+        content = b"".join(api_client.get(url).streaming_content).decode()
+        header, row = csv.reader(StringIO(content))
+        assert header == export.FAVORITE_FIELDS
+        assert row[2:5] == ["Drink 3", "Cocktail", "Stir,\nthen pour."]
+        assert row[8] == "Gin (1 oz); Bitters 3"
+
+        missing = reverse("api:export", kwargs={"kind": "recipes", "fmt": "xml"})
+        assert api_client.get(missing).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_export_command(self, pks, user, tmp_path):
+        out = StringIO()
+        call_command("export_catalog", stdout=out)
+        assert len(out.getvalue().splitlines()) == 7
+
+        Favorite.objects.create(user=user, recipe_id=pks[5])
+        path = tmp_path / "favorites.csv"
+        out = StringIO()
+        call_command(
+            "export_catalog",
+            "--format=csv",
+            f"--user={user.username}",
+            f"--output={path}",
+            stdout=out,
+        )
+        assert "Exported 1 recipes" in out.getvalue()
+        rows = list(csv.DictReader(path.open(newline="")))
+        assert rows[0]["title"] == "Drink 5"
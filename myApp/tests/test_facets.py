@@ -0,0 +1,125 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
+from myApp.models import Category, Ingredient, Recipe
+
+
+@pytest.mark.django_db
+class TestFacets:
+
+    @pytest.fixture
+    def pks(self):
+        pks = CatalogWriter().write(
+            [
+                Drink(
+                    id=1,
+                    title="Gin Fizz",
+                    category="Cocktail",
+                    ingredients=(("Gin", ""), ("Lemon", "")),
+                ),
+                Drink(
+                    id=2,
+                    title="Gin Sour",
+                    category="Cocktail",
+                    ingredients=(("Gin", ""), ("Sugar", "")),
+                ),
+                Drink(
+                    id=3,
+                    title="Lemonade",
+                    category="Soft Drink",
+                    ingredients=(("Lemon", ""), ("Sugar", "")),
+                ),
+                Drink(
+                    id=4, title="Gin Shot", category="Shot", ingredients=(("Gin", ""),)
+                ),
+            ]
+        )
+        # Averages of 4.5, 2, unrated and 4
+        Recipe.objects.filter(pk=pks[1]).update(rating_count=2, rating_sum=9)
+        Recipe.objects.filter(pk=pks[2]).update(rating_count=1, rating_sum=2)
+        Recipe.objects.filter(pk=pks[4]).update(rating_count=1, rating_sum=4)
+        return pks
+
+    def ids(self, *names, model=Ingredient):
+        return ",".join(str(model.objects.get(name=name).pk) for name in names)
+
+    def test_filters(self, api_client, pks):
+        url = reverse("api:recipes-list")
+
+        def titles(params):
+            return [r["title"] for r in api_client.get(url, params).data["results"]]
+
+        gin = self.ids("Gin")
+        assert titles({"ingredient": gin}) == ["Gin Fizz", "Gin Sour", "Gin Shot"]
+        assert titles({"ingredient": self.ids("Gin", "Lemon")}) == ["Gin Fizz"]
+        cocktail_or_shot = self.ids("Cocktail", "Shot", model=Category)
+        assert titles({"category": cocktail_or_shot, "rating_min": 3}) == [
+            "Gin Fizz",
+            "Gin Shot",
+        ]
+        assert titles({"search": "gin", "rating_max": "2"}) == ["Gin Sour"]
+
+        for invalid in [
+            {"category": "x"},
+            {"category": str(2**64)},
+            {"ingredient": "0"},
+            {"rating_min": "x"},
+            {"rating_max": 6},
+            {"rating_min": "NaN"},
+            {"rating_max": "sNaN"},
+            {"rating_min": "Infinity"},
+        ]:
+            for endpoint in [url, reverse("api:recipes-facets")]:
+                response = api_client.get(endpoint, invalid)
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_counts(self, api_client, pks):
+        url = reverse("api:recipes-facets")
+        params = {
+            "category": self.ids("Cocktail", model=Category),
+            "rating_min": "3",
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            data = api_client.get(url, params).data
+
+        assert data["count"] == 1
+        # Categories and ratings are counted without their own filter
+        assert [(c["name"], c["count"]) for c in data["facets"]["category"]] == [
+            ("Cocktail", 1),
+            ("Shot", 1),
+        ]
+        assert [(i["name"], i["count"]) for i in data["facets"]["ingredient"]] == [
+            ("Gin", 1),
+            ("Lemon", 1),
+        ]
+        assert {r["range"]: r["count"] for r in data["facets"]["rating"]} == {
+            "unrated": 0,
+            "0-2": 0,
+            "2-3": 1,
+            "3-4": 0,
+            "4-5": 1,
+        }
+        # One grouped query per facet and the count
+        assert len(queries) == 4
+
+        # Cached per normalized filter set
+        with CaptureQueriesContext(connection) as queries:
+            params["rating_min"] = "3.0"
+            assert api_client.get(url, params).data == data
+        assert not queries
+
+    def test_counts_follow_the_search_and_catalog(self, api_client, pks):
+        url = reverse("api:recipes-facets")
+        data = api_client.get(url, {"search": "shot"}).data
+        assert data["count"] == 1
+        shot = Category.objects.get(name="Shot").pk
+        assert data["facets"]["category"] == [{"id": shot, "name": "Shot", "count": 1}]
+
+        CatalogWriter().write([Drink(id=5, title="Tequila Shot", category="Shot")])
+        data = api_client.get(url, {"search": "shot"}).data
+        assert data["facets"]["category"][0]["count"] == 2
@@ -0,0 +1,140 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter, iter_dump
+from myApp.models import Category, Ingredient, Recipe, RecipeIngredient
+
+
+def api_drink(drink_id, title, category="Cocktail", ingredients=("Gin", "Tonic")):
+    data = {
+        "idDrink": str(drink_id),
+        "strDrink": title,
+        "strCategory": category,
+        "strInstructions": "Stir.",
+        "strDrinkThumb": f"http://img.com/{drink_id}.jpg",
+        "strInstructionsDE": None,
+    }
+    for number in range(1, 16):
+        name = ingredients[number - 1] if number <= len(ingredients) else None
+        data[f"strIngredient{number}"] = name
+        data[f"strMeasure{number}"] = "1 oz" if name else None
+    return data
+
+
+@pytest.mark.django_db
+class TestImportCatalog:
+
+    def test_iter_dump_streams_json_payload(self, tmp_path):
+        path = tmp_path / "dump.json"
+        drinks = [api_drink(i, f"Drink {i}") for i in range(50)]
+        path.write_text(json.dumps({"drinks": drinks}, indent=2))
+
+        # A tiny chunk size forces elements to straddle reads
+        assert list(iter_dump(path, chunk_size=64)) == drinks
+
+    def test_import_ndjson(self, tmp_path):
+        path = tmp_path / "dump.ndjson"
+        path.write_text(
+            "\n".join(
+                json.dumps(d)
+                for d in [
+                    api_drink(1, "Gin Tonic"),
+                    api_drink(2, "Negroni", ingredients=("Gin", "Campari")),
+                    {"strDrink": "no id"},
+                ]
+            )
+        )
+        out = StringIO()
+        call_command("import_catalog", str(path), stdout=out, stderr=StringIO())
+
+        assert Recipe.objects.count() == 2
+        assert Ingredient.objects.count() == 3
+        assert RecipeIngredient.objects.filter(recipe__recipe_id=2).count() == 2
+        assert "Imported 2 recipes" in out.getvalue()
+        assert "rows/s" in out.getvalue()
+
+    def test_import_upserts_on_recipe_id(self, tmp_path, recipe):
+        path = tmp_path / "dump.json"
+        path.write_text(
+            json.dumps(
+                [
+                    api_drink(
+                        recipe.recipe_id, "Renamed", ingredients=("Lemon", "Rum")
+                    ),
+                    api_drink(7, "Other", category="Punch"),
+                ]
+            )
+        )
+        call_command(
+            "import_catalog", str(path), "--batch-size", "1", stdout=StringIO()
+        )
+
+        recipe.refresh_from_db()
+        assert recipe.title == "Renamed"
+        assert Recipe.objects.count() == 2
+        assert list(
+            recipe.recipe_ingredients.values_list("ingredient__name", flat=True)
+        ) == ["Lemon", "Rum"]
+        assert Category.objects.filter(name="Punch").exists()
+
+    def test_rewriting_changed_drinks_is_a_fixed_number_of_queries(
+        self, django_capture_on_commit_callbacks
+    ):
+        def rewrite(size):
+            names = [f"Ingredient {i}" for i in range(size)]
+            drink = Drink(
+                id=size, title="Drink", ingredients=tuple((n, "") for n in names)
+            )
+            CatalogWriter().write([drink])
+            writer = CatalogWriter()
+            with CaptureQueriesContext(connection) as queries:
+                with django_capture_on_commit_callbacks() as callbacks:
+                    writer.write([drink._replace(title="Changed")])
+            return len(queries), len(callbacks)
+
+        assert rewrite(2) == rewrite(10)
+        assert RecipeIngredient.objects.filter(recipe__recipe_id=10).count() == 10
+
+
+@pytest.mark.django_db
+class TestSyncCatalog:
+
+    def test_only_changed_recipes_are_written(self, tmp_path, cocktaildb_client):
+        path = tmp_path / "dump.json"
+        path.write_text(
+            json.dumps([api_drink(1, "Gin Tonic"), api_drink(2, "Negroni")])
+        )
+        call_command("import_catalog", str(path), stdout=StringIO())
+        unchanged = Recipe.objects.get(recipe_id=1)
+
+        cocktaildb_client.drinks = [
+            api_drink(1, "Gin Tonic"),
+            api_drink(2, "Negroni", ingredients=("Gin", "Campari", "Vermouth")),
+        ]
+        out = StringIO()
+        call_command("sync_catalog", "--rate", "0", stdout=out)
+
+        assert "2 recipes" in out.getvalue()
+        assert "1 updated, 1 unchanged" in out.getvalue()
+        negroni = Recipe.objects.get(recipe_id=2)
+        assert negroni.recipe_ingredients.count() == 3
+        assert Recipe.objects.get(recipe_id=1).updated_at == unchanged.updated_at
+
+    def test_resume_skips_synced_recipes(self, recipe, cocktaildb_client):
+        from django.core.cache import cache
+
+        cocktaildb_client.drinks = [api_drink(recipe.recipe_id, "Renamed")]
+        cache.set("sync_catalog:checkpoint", recipe.recipe_id, None)
+
+        out = StringIO()
+        call_command("sync_catalog", "--resume", stdout=out)
+
+        assert "Checked 0 recipes" in out.getvalue()
+        recipe.refresh_from_db()
+        assert recipe.title == "Test Drink"
+        assert cache.get("sync_catalog:checkpoint") is None
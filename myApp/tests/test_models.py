@@ -1,5 +1,8 @@
 import pytest
 from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
 from myApp.models import Rating, Favorite
 from django.contrib.auth.models import User
 
@@ -28,3 +31,49 @@ class TestModels:
     def test_favorite_creation(self, user, recipe):
         fav = Favorite.objects.create(user=user, recipe=recipe)
         assert str(fav) == f"{user.username} added {recipe.title}"
+
+
+@pytest.mark.django_db
+class TestRatingStats:
+
+    def stats(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.rating_count, recipe.rating_sum, recipe.rating_average
+
+    def test_maintained_on_update_and_delete(self, recipe, user):
+        user2 = User.objects.create_user(username="u2", password="p")
+        rating = Rating.objects.create(recipe=recipe, user=user, rate=Decimal("4.0"))
+        Rating.objects.create(recipe=recipe, user=user2, rate=Decimal("2.5"))
+        assert self.stats(recipe)[:2] == (2, Decimal("6.5"))
+
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.rate = Decimal("5.0")
+        rating.save()
+        assert self.stats(recipe) == (2, Decimal("7.5"), Decimal("3.8"))
+
+        # Saved without being loaded, the stats are recomputed
+        Rating(pk=rating.pk, recipe=recipe, user=user, rate=Decimal("1.0")).save()
+        assert self.stats(recipe) == (2, Decimal("3.5"), Decimal("1.8"))
+
+        Rating.objects.filter(user=user2).delete()
+        assert self.stats(recipe) == (1, Decimal("1.0"), Decimal("1.0"))
+
+    def test_rating_form_updates_stats(self, client, recipe, user):
+        client.force_login(user)
+        url = reverse("myApp:rating_form", kwargs={"pk": recipe.pk})
+
+        client.post(url, {"rate": "3"})
+        client.post(url, {"rate": "5"})
+
+        assert self.stats(recipe) == (1, Decimal("5.0"), Decimal("5.0"))
+
+    def test_repair_command(self, recipe, user):
+        Rating.objects.create(recipe=recipe, user=user, rate=Decimal("4.0"))
+        # Bulk updates bypass the signals
+        Rating.objects.update(rate=Decimal("2.0"))
+        out = StringIO()
+
+        call_command("repair_ratings", stdout=out)
+
+        assert "Repaired the rating stats of 1 recipes." in out.getvalue()
+        assert self.stats(recipe) == (1, Decimal("2.0"), Decimal("2.0"))
@@ -0,0 +1,137 @@
+import random
+
+import pytest
+from django.urls import reverse
+from myApp import pantry
+from myApp.models import Favorite, RecipeIngredient
+
+
+class TestBitsets:
+
+    def test_counts_match_brute_force(self):
+        rng = random.Random(7)
+        bitsets = [rng.getrandbits(200) for _ in range(11)]
+        slices = pantry.count_bits(bitsets)
+        among = (1 << 200) - 1
+
+        for value in range(12):
+            expected = sum(
+                1 << r
+                for r in range(200)
+                if sum(bits >> r & 1 for bits in bitsets) == value
+            )
+            assert pantry.equal_bits(slices, value, among) == expected
+
+
+@pytest.mark.django_db
+class TestPantryIndex:
+
+    def names(self, names):
+        known, _ = pantry.index.resolve(names)
+        return list(known)
+
+    def test_makeable_ranked_by_coverage(self, make_drink, write_drinks):
+        pks = write_drinks(
+            make_drink(1, "Gin Tonic", ["Gin", "Tonic"]),
+            make_drink(2, "Gimlet", ["Gin", "Lime", "Sugar"]),
+            make_drink(3, "Mojito", ["Rum", "Lime", "Sugar", "Mint"]),
+            make_drink(4, "Daiquiri", ["Rum", "Lime", "Sugar"]),
+        )
+        owned = self.names(["gin", "LIME", "sugar"])
+
+        count, matches = pantry.index.makeable(owned)
+        assert count == 1
+        assert [m[0] for m in matches] == [pks[2]]
+
+        count, matches = pantry.index.makeable(owned, max_missing=1)
+        assert count == 3
+        # 3/3 owned, then 2/3, then 1/2
+        assert [m[0] for m in matches] == [pks[2], pks[4], pks[1]]
+        assert [len(m[2]) for m in matches] == [0, 1, 1]
+
+        _, matches = pantry.index.makeable(owned, max_missing=2, limit=2)
+        assert [m[0] for m in matches] == [pks[2], pks[4]]
+
+    def test_follows_recipe_ingredient_changes(self, make_drink, write_drinks):
+        pks = write_drinks(make_drink(1, "Gin Tonic", ["Gin", "Tonic"]))
+        owned = self.names(["Gin"])
+        assert pantry.index.makeable(owned)[0] == 0
+
+        RecipeIngredient.objects.filter(
+            recipe_id=pks[1], ingredient__name="Tonic"
+        ).delete()
+        assert pantry.index.makeable(owned)[0] == 1
+
+        write_drinks(make_drink(1, "Gin Tonic", ["Gin", "Tonic", "Lime"]))
+        assert pantry.index.makeable(owned, max_missing=2)[1][0][0] == pks[1]
+
+    def test_endpoint(self, api_client, make_drink, write_drinks):
+        pks = write_drinks(
+            make_drink(1, "Gin Tonic", ["Gin", "Tonic"]),
+            make_drink(2, "Negroni", ["Gin", "Campari", "Vermouth"]),
+        )
+
+        url = reverse("api:makeable") + "?ingredients=gin,tonic,kiwi&missing=2"
+        response = api_client.get(url)
+
+        assert response.status_code == 200
+        assert response.data["unknown"] == ["kiwi"]
+        assert response.data["count"] == 2
+        assert [r["id"] for r in response.data["results"]] == [pks[1], pks[2]]
+        assert response.data["results"][1]["missing"] == ["Campari", "Vermouth"]
+        assert response.data["results"][1]["coverage"] == 0.33
+
+        response = api_client.get(reverse("api:makeable") + "?missing=9")
+        assert response.status_code == 400
+
+    def test_similar_matches_brute_force_jaccard(self, make_drink, write_drinks):
+        rng = random.Random(3)
+        names = [f"Ingredient {i}" for i in range(12)]
+        recipes = {i: set(rng.sample(names, rng.randint(1, 6))) for i in range(1, 61)}
+        pks = write_drinks(
+            *(make_drink(i, f"Drink {i}", sorted(r)) for i, r in recipes.items())
+        )
+        by_pk = {pks[i]: r for i, r in recipes.items()}
+
+        for pk, own in list(by_pk.items())[:10]:
+            expected = sorted(
+                (len(own & other) / len(own | other), other_pk)
+                for other_pk, other in by_pk.items()
+                if other_pk != pk and own & other
+            )
+            similar = pantry.index.similar(pk, limit=10)
+            # Ties may come in any order, the scores may not
+            assert [score for _, score in similar] == pytest.approx(
+                sorted((score for score, _ in expected), reverse=True)[:10]
+            )
+            for other_pk, score in similar:
+                assert score == pytest.approx(
+                    len(own & by_pk[other_pk]) / len(own | by_pk[other_pk])
+                )
+
+    def test_similar_drinks_field_and_panel(
+        self, api_client, client, user, make_drink, write_drinks
+    ):
+        pks = write_drinks(
+            make_drink(1, "Gin Tonic", ["Gin", "Tonic"]),
+            make_drink(2, "Gin Lime Tonic", ["Gin", "Tonic", "Lime"]),
+            make_drink(3, "Gimlet", ["Gin", "Lime", "Sugar"]),
+            make_drink(4, "Cuba Libre", ["Rum", "Cola"]),
+        )
+        url = reverse("api:recipes-detail", kwargs={"pk": pks[1]})
+
+        assert api_client.get(url).data["similar_drinks"] == [
+            {"id": pks[2], "score": 0.6667},
+            {"id": pks[3], "score": 0.25},
+        ]
+
+        favorite = Favorite.objects.create(user=user, recipe_id=pks[1])
+        client.force_login(user)
+        response = client.get(
+            reverse("myApp:detail_favorite", kwargs={"pk": favorite.pk})
+        )
+        assert [r.title for r, _ in response.context["similar_drinks"]] == [
+            "Gin Lime Tonic",
+            "Gimlet",
+        ]
+        assert "67% same ingredients" in response.content.decode()
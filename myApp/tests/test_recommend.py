@@ -0,0 +1,99 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from myApp import recommend
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
+from myApp.models import Favorite, Rating, RecipeSimilarity
+
+
+def stored():
+    return {
+        (recipe_pk, other): pytest.approx(score)
+        for recipe_pk, other, score in RecipeSimilarity.objects.values_list(
+            "recipe_id", "similar_id", "score"
+        )
+    }
+
+
+@pytest.mark.django_db
+class TestRecommendations:
+
+    @pytest.fixture
+    def pks(self):
+        pks = CatalogWriter().write(
+            [Drink(id=i, title=f"Drink {i}") for i in range(1, 7)]
+        )
+        return [pks[i] for i in range(1, 7)]
+
+    @pytest.fixture
+    def users(self):
+        return [User.objects.create_user(username=f"user{i}") for i in range(4)]
+
+    def like(self, user, *recipe_pks):
+        for recipe_pk in recipe_pks:
+            Favorite.objects.create(user=user, recipe_id=recipe_pk)
+
+    def test_build_scores_cosine_similarity(self, pks, users):
+        self.like(users[0], pks[0], pks[1])
+        self.like(users[1], pks[0], pks[1], pks[2])
+        # Liking 5 stars counts as a favorite, 2 stars not at all
+        Rating.objects.create(user=users[2], recipe_id=pks[0], rate=5)
+        Rating.objects.create(user=users[2], recipe_id=pks[2], rate=2)
+
+        assert recommend.build() == 3
+
+        # pks[0] has users 0, 1 and 2, pks[1] users 0 and 1
+        assert recommend.similar_recipes(pks[0]) == [
+            (pks[1], pytest.approx(2 / (3**0.5 * 2**0.5))),
+            (pks[2], pytest.approx(1 / 3**0.5)),
+        ]
+        assert recommend.similar_recipes(pks[3]) == []
+
+    def test_update_matches_a_full_build(self, pks, users):
+        self.like(users[0], pks[0], pks[1])
+        self.like(users[1], pks[1], pks[2], pks[3])
+        self.like(users[2], pks[3], pks[4])
+        recommend.build(k=2)
+
+        self.like(users[0], pks[3])
+        Rating.objects.create(user=users[3], recipe_id=pks[1], rate=4)
+        Rating.objects.create(user=users[3], recipe_id=pks[5], rate=4.5)
+        changed = recommend.changed_since(Favorite.objects.last().created_at)
+        recommend.update(changed, k=2)
+        updated = stored()
+
+        recommend.build(k=2)
+        assert updated == stored()
+
+    def test_api(self, api_client, pks, users):
+        self.like(users[0], pks[0], pks[1], pks[2])
+        self.like(users[1], pks[0], pks[1])
+        self.like(users[2], pks[0])
+        recommend.build()
+
+        url = reverse("api:recipes-also-liked", kwargs={"pk": pks[0]})
+        results = api_client.get(url, {"limit": 1}).data["results"]
+        assert [(r["id"], r["title"]) for r in results] == [(pks[1], "Drink 2")]
+
+        url = reverse("api:recommendations")
+        assert api_client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+        api_client.force_authenticate(user=users[2])
+        results = api_client.get(url).data["results"]
+        assert [r["id"] for r in results] == [pks[1], pks[2]]
+        assert results[0]["score"] > results[1]["score"]
+
+    def test_command(self, pks, users):
+        self.like(users[0], pks[0], pks[1])
+        out = StringIO()
+        call_command("build_recommendations", "--incremental", stdout=out)
+        assert "Built the neighbours of 2 recipes." in out.getvalue()
+
+        self.like(users[1], pks[1], pks[2])
+        call_command("build_recommendations", "--incremental", stdout=out)
+        assert "after changes to 2." in out.getvalue()
+        assert recommend.similar_recipes(pks[2]) == [(pks[1], pytest.approx(0.5**0.5))]
@@ -0,0 +1,86 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from myApp import search
+from myApp.models import Recipe
+from myApp.signals import CATALOG_VERSION_KEY
+
+
+@pytest.mark.django_db
+class TestSearchIndex:
+
+    def test_tokenize(self):
+        assert search.tokenize("Piña Colada, with the RUM") == ["pina", "colada", "rum"]
+
+    def test_ranks_title_above_instructions(self, make_drink, write_drinks):
+        pks = write_drinks(
+            make_drink(1, "Gin Fizz", instructions="Shake with lemon."),
+            make_drink(2, "Lemon Drop", ingredients=("Vodka", "Lemon")),
+            make_drink(3, "Negroni"),
+        )
+
+        assert search.index.search("lemon") == [pks[2], pks[1]]
+        assert search.index.search("gin lemon") == [pks[1]]
+        assert search.index.search("mojito") == []
+
+    def test_last_term_matches_prefixes(self, make_drink, write_drinks):
+        pks = write_drinks(
+            make_drink(1, "Margarita"),
+            make_drink(2, "Martini"),
+            make_drink(3, "Mojito"),
+        )
+
+        assert set(search.index.search("mar")) == {pks[1], pks[2]}
+        assert search.index.search("pina colada") == []
+
+    def test_incremental_updates(self, make_drink, write_drinks):
+        pks = write_drinks(make_drink(1, "Gin Fizz"))
+        assert search.index.search("fizz") == [pks[1]]
+
+        # Writes of this process are applied on the next query
+        write_drinks(make_drink(1, "Gin Sour"), make_drink(2, "Whiskey Sour"))
+        assert search.index.search("fizz") == []
+        assert len(search.index.search("sour")) == 2
+
+        Recipe.objects.filter(recipe_id=2).delete()
+        assert search.index.search("sour") == [pks[1]]
+
+    def test_picks_up_changes_of_other_workers(
+        self, monkeypatch, make_drink, write_drinks
+    ):
+        pks = write_drinks(make_drink(1, "Gin Fizz"))
+        search.index.search("fizz")
+
+        # Another worker renames the recipe, bumping the catalog version
+        Recipe.objects.filter(pk=pks[1]).update(title="Gin Sour")
+        cache.set(CATALOG_VERSION_KEY, "other-worker")
+        monkeypatch.setattr(search.index, "SYNC_INTERVAL", 0)
+
+        assert search.index.search("sour") == [pks[1]]
+
+
+@pytest.mark.django_db
+class TestLocalSearch:
+
+    def test_search_view_uses_local_catalog(
+        self, client, cocktaildb_client, make_drink, write_drinks
+    ):
+        write_drinks(make_drink(1, "Gin Fizz", ingredients=("Gin", "Lemon")))
+
+        response = client.get(reverse("myApp:search") + "?query=fizz")
+
+        assert response.status_code == 200
+        assert response.context["drinks"] == [
+            make_drink(1, "Gin Fizz", ingredients=("Gin", "Lemon"))
+        ]
+        assert "search.php" not in cocktaildb_client.metrics.snapshot()
+
+    def test_api_search_is_ranked(self, api_client, make_drink, write_drinks):
+        pks = write_drinks(
+            make_drink(1, "Gin Fizz", instructions="Shake with lemon."),
+            make_drink(2, "Lemon Drop", ingredients=("Vodka", "Lemon")),
+        )
+
+        response = api_client.get(reverse("api:recipes-list") + "?search=lemon")
+
+        assert [r["id"] for r in response.data["results"]] == [pks[2], pks[1]]
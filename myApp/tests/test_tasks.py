@@ -0,0 +1,116 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from myApp import tasks
+from myApp.models import Favorite, Job, Recipe
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    """A task failing its first `failures` calls."""
+    calls = []
+    monkeypatch.setitem(tasks.registry, "flaky", None)
+
+    @tasks.task("flaky", max_attempts=2)
+    def flaky(failures=0):
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("try again")
+
+    return calls
+
+
+@pytest.fixture
+def queued(settings):
+    settings.TASKS = {**settings.TASKS, "EAGER": False, "RETRY_DELAY": 0}
+
+
+@pytest.mark.django_db
+class TestTasks:
+
+    def test_eager_jobs_run_inline(self, flaky):
+        job = tasks.enqueue("flaky")
+
+        assert flaky == [1]
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == (Job.DONE, 1)
+        assert job.duration >= 0
+        assert job.started_at <= job.finished_at
+
+    def test_pending_keys_are_enqueued_once(self, flaky, queued):
+        first = tasks.enqueue("flaky", key="k")
+        assert tasks.enqueue("flaky", key="k") == first
+        assert Job.objects.count() == 1
+
+        tasks.run(*tasks.claim(10))
+        assert tasks.enqueue("flaky", key="k") != first
+        assert tasks.enqueue("flaky") != tasks.enqueue("flaky")
+
+    def test_retries_then_fails(self, flaky, queued):
+        job = tasks.enqueue("flaky", failures=5)
+
+        tasks.run(*tasks.claim(10))
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == (Job.PENDING, 1)
+        assert job.error == "RuntimeError: try again"
+
+        tasks.run(*tasks.claim(10))
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == (Job.FAILED, 2)
+        assert tasks.claim(10) == []
+
+    def test_retry_waits_for_its_delay(self, flaky, queued, settings):
+        settings.TASKS["RETRY_DELAY"] = 60
+        tasks.enqueue("flaky", failures=1)
+        tasks.run(*tasks.claim(10))
+
+        assert tasks.claim(10) == []
+        Job.objects.update(run_after=timezone.now())
+        assert tasks.run(*tasks.claim(10)).status == Job.DONE
+
+    def test_lost_jobs_are_requeued(self, flaky, queued):
+        job = tasks.enqueue("flaky")
+        tasks.claim(10)
+        assert tasks.requeue_lost() == 0
+
+        Job.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        assert tasks.requeue_lost() == 1
+        job.refresh_from_db()
+        assert job.status == Job.PENDING
+        assert job.error.startswith("Timed out")
+
+    def test_views_enqueue_recommendation_updates(self, client, user, recipe, queued):
+        client.force_login(user)
+        client.get(reverse("myApp:add_favorite", kwargs={"pk": recipe.recipe_id}))
+        client.post(
+            reverse("myApp:rating_form", kwargs={"pk": recipe.pk}), {"rate": "4"}
+        )
+
+        # Both changes are covered by one pending job
+        (job,) = Job.objects.all()
+        assert (job.name, job.kwargs) == (
+            "update_recommendations",
+            {"recipe_pk": recipe.pk},
+        )
+
+
+@pytest.mark.django_db
+def test_worker_command(user, cocktaildb_client, queued):
+    cocktaildb_client.drinks = [{"idDrink": "7", "strDrink": "Queued"}]
+    tasks.enqueue("favorite_drink", user_id=user.pk, drink_id=7)
+    tasks.enqueue("favorite_drink", user_id=user.pk, drink_id=8)
+    out = StringIO()
+
+    call_command("run_tasks", "--once", "--workers=1", stdout=out)
+
+    assert Favorite.objects.get(user=user).recipe == Recipe.objects.get(recipe_id=7)
+    # Drink 8 isn't upstream, the favorite job enqueued the recommendations
+    assert "Ran 3 jobs" in out.getvalue()
+    assert "2 done, 0 to retry, 1 failed" in out.getvalue()
+    missing = Job.objects.get(kwargs__drink_id=8)
+    assert (missing.status, missing.attempts) == (Job.FAILED, 1)
+    assert missing.error == "Drink 8 not found upstream"
@@ -0,0 +1,76 @@
+import pytest
+from django.urls import reverse
+from myApp import typeahead
+from myApp.ingest import CatalogWriter
+from myApp.models import Favorite, Recipe
+
+
+@pytest.mark.django_db
+class TestTypeahead:
+
+    def test_completes_names_from_any_word(self, make_drink):
+        pks = CatalogWriter().write(
+            [
+                make_drink(1, "Margarita", ingredients=("Tequila", "Lime")),
+                make_drink(2, "Frozen Margarita", ingredients=("Tequila",)),
+                make_drink(3, "Mojito", ingredients=("Rum", "Lime")),
+            ]
+        )
+
+        completions = typeahead.index.complete("MARG")
+
+        # Names starting with the prefix rank first
+        assert completions["recipes"] == [
+            (pks[1], "Margarita"),
+            (pks[2], "Frozen Margarita"),
+        ]
+        assert [name for _, name in typeahead.index.complete("l")["ingredients"]] == [
+            "Lime"
+        ]
+        assert typeahead.index.complete("marg", limit=1)["recipes"] == [
+            (pks[1], "Margarita")
+        ]
+        assert typeahead.index.complete("  ") == {"recipes": [], "ingredients": []}
+
+    def test_ranks_by_popularity(self, user, make_drink):
+        pks = CatalogWriter().write(
+            [make_drink(1, "Gin Sour"), make_drink(2, "Gin Fizz")]
+        )
+        Favorite.objects.create(user=user, recipe_id=pks[1])
+
+        assert [pk for pk, _ in typeahead.index.complete("gin")["recipes"]] == [
+            pks[1],
+            pks[2],
+        ]
+
+    def test_incremental_updates(self, make_drink):
+        writer = CatalogWriter()
+        pks = writer.write([make_drink(1, "Gin Fizz")])
+        assert typeahead.index.complete("gin f")["recipes"] == [(pks[1], "Gin Fizz")]
+
+        writer.write(
+            [make_drink(1, "Gin Sour"), make_drink(2, "Gimlet", ingredients=("Gin",))]
+        )
+        assert typeahead.index.complete("gin f")["recipes"] == []
+        assert [name for _, name in typeahead.index.complete("gi")["recipes"]] == [
+            "Gimlet",
+            "Gin Sour",
+        ]
+
+        Recipe.objects.filter(recipe_id=2).delete()
+        assert typeahead.index.complete("gim")["recipes"] == []
+
+    def test_endpoint(self, api_client, make_drink):
+        pks = CatalogWriter().write(
+            [make_drink(1, "Negroni", ingredients=("Campari",))]
+        )
+
+        response = api_client.get(reverse("api:typeahead") + "?q=ne")
+
+        assert response.status_code == 200
+        assert response.data == {
+            "recipes": [{"id": pks[1], "title": "Negroni"}],
+            "ingredients": [],
+        }
+        response = api_client.get(reverse("api:typeahead") + "?q=ne&limit=x")
+        assert response.status_code == 400
@@ -1,36 +1,102 @@
+import time
+from io import StringIO
+
 import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from unittest.mock import patch
-from myApp.models import Recipe, Favorite, Ingredient
+from myApp import caching, cocktaildb, drink_pool, tasks, views
+from myApp.drinks import Drink
+from myApp.ingest import CatalogWriter
+from myApp.models import Recipe, Favorite, Ingredient, Job, Rating
 
 
 @pytest.mark.django_db
 class TestStandardViews:
 
-    @patch("myApp.views.requests.get")
-    def test_index_view_success(self, mock_get, client):
-        # Mock the external API response
-        mock_response = {"drinks": [{"strDrink": "Mojito", "strDrinkThumb": "url"}]}
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_response
+    def test_index_view_picks_from_the_pool(self, client, cocktaildb_client):
+        drink = {"idDrink": "1", "strDrink": "Mojito", "strDrinkThumb": "url"}
+        cocktaildb_client.drinks = [drink]
+        call_command("refill_drink_pool", "--count=3", stdout=StringIO())
 
-        url = reverse("myApp:index")
-        response = client.get(url)
+        def fail(endpoint, params):
+            raise AssertionError("TheCocktailDB called on the request path")
+
+        cocktaildb_client._request = fail
+        response = client.get(reverse("myApp:index"))
 
         assert response.status_code == 200
-        assert response.context["drink"] == mock_response["drinks"][0]
+        assert response.context["drink"] == Drink.from_api(drink)
+
+    def test_index_view_cold_pool(self, client, cocktaildb_client, monkeypatch):
+        monkeypatch.setattr(caching, "BACKGROUND_REFRESH", False)
+        cocktaildb_client.drinks = [{"idDrink": "1", "strDrink": "Mojito"}]
+        CatalogWriter().write([Drink(id=2, title="Stored")])
+        monkeypatch.setattr(drink_pool, "REFILL_INTERVAL", 0)
+        down = []
+
+        def request(endpoint, params):
+            if down:
+                raise cocktaildb.CocktailDBError("down")
+            return cocktaildb.LocalCocktailDBClient._request(
+                cocktaildb_client, endpoint, params
+            )
+
+        monkeypatch.setattr(cocktaildb_client, "_request", request)
+        # The empty pool is filled, inline in tests
+        response = client.get(reverse("myApp:index"))
+        assert response.context["drink"].title == "Stored"
+        drinks, _ = cache.get(drink_pool.POOL_KEY)
+        assert [d.title for d in drinks] == ["Mojito"]
+
+        # A failed refill keeps the pool
+        down.append(True)
+        response = client.get(reverse("myApp:index"))
+        assert response.context["drink"].title == "Mojito"
+        assert cache.get(drink_pool.POOL_KEY)[0] == drinks
 
-    @patch("myApp.views.requests.get")
-    def test_search_view(self, mock_get, client):
-        mock_response = {"drinks": [{"strDrink": "Margarita"}]}
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_response
+    def test_index_view_outdated_local_pool(
+        self, client, cocktaildb_client, monkeypatch
+    ):
+        monkeypatch.setattr(caching, "BACKGROUND_REFRESH", False)
+        old = Drink(id=1, title="Old")
+        cache.set(drink_pool.POOL_KEY, ((old,), 0), None)
+        # Another worker refilled the shared tier, this worker's L1 still
+        # holds the old pool
+        new = Drink(id=2, title="New")
+        caches["shared"].set(drink_pool.POOL_KEY, ((new,), time.time()), None)
+
+        def fail(endpoint, params):
+            raise AssertionError("the pool was already refilled")
+
+        cocktaildb_client._request = fail
+        assert client.get(reverse("myApp:index")).context["drink"] == old
+        assert client.get(reverse("myApp:index")).context["drink"] == new
+
+    def test_index_view_falls_back_to_the_catalog(
+        self, client, cocktaildb_client, monkeypatch
+    ):
+        monkeypatch.setattr(drink_pool, "_refill_if_due", lambda count: None)
+        response = client.get(reverse("myApp:index"))
+        assert response.context["drink"] is None
+
+        CatalogWriter().write([Drink(id=2, title="Stored")])
+        response = client.get(reverse("myApp:index"))
+        assert response.context["drink"].title == "Stored"
+
+    def test_search_view(self, client, cocktaildb_client):
+        drink = {"idDrink": "2", "strDrink": "Margarita"}
+        cocktaildb_client.drinks = [drink]
 
         url = reverse("myApp:search") + "?query=Margarita"
         response = client.get(url)
 
         assert response.status_code == 200
-        assert response.context["drinks"] == mock_response["drinks"]
+        assert response.context["drinks"] == [Drink.from_api(drink)]
+        assert cocktaildb_client.metrics.snapshot()["search.php"]["calls"] == 1
 
     def test_my_favorites_view(self, client, user, recipe):
         client.force_login(user)
@@ -44,8 +110,7 @@ class TestStandardViews:
 
     # --- Testing Complex "Add to Favorite" Logic ---
 
-    @patch("myApp.views.requests.get")
-    def test_add_to_favorite_new_recipe(self, mock_get, client, user):
+    def test_add_to_favorite_new_recipe(self, client, user, cocktaildb_client):
         """Test adding a recipe that does NOT exist in our DB yet"""
         client.force_login(user)
 
@@ -66,9 +131,8 @@ class TestStandardViews:
             mock_drink_data[f"strIngredient{i}"] = None
             mock_drink_data[f"strMeasure{i}"] = None
 
-        # 3. Setup the mock response
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {"drinks": [mock_drink_data]}
+        # 3. Serve it from the local stand-in
+        cocktaildb_client.drinks = [mock_drink_data]
 
         # 4. Call the view
         url = reverse("myApp:add_favorite", kwargs={"pk": 99999})
@@ -83,6 +147,56 @@ class TestStandardViews:
         # Check Redirect
         assert response.redirect_chain[0][0] == reverse("myApp:my_favorites")
 
+    def test_add_to_favorite_is_one_bounded_transaction(
+        self, client, user, cocktaildb_client, django_assert_max_num_queries, settings
+    ):
+        drink = {
+            "idDrink": "99998",
+            "strDrink": "Long Island",
+            "strCategory": "Cocktail",
+            "strInstructions": "Stir.",
+            "strDrinkThumb": "http://img.com",
+        }
+        for i in range(1, 16):
+            drink[f"strIngredient{i}"] = f"Spirit {i}"
+            drink[f"strMeasure{i}"] = "1/2 oz"
+        cocktaildb_client.drinks = [drink]
+        client.force_login(user)
+        url = reverse("myApp:add_favorite", kwargs={"pk": 99998})
+        settings.TASKS = {**settings.TASKS, "EAGER": False}
+
+        # The request only enqueues the ingest
+        with django_assert_max_num_queries(8):
+            client.get(url)
+        assert cocktaildb_client.metrics.snapshot() == {}
+
+        # 15 new ingredients used to cost 30+ queries for the ingest alone,
+        # now it is a fixed number plus savepoints, the job bookkeeping and
+        # the recommendations job it enqueues
+        (job,) = tasks.claim(10)
+        with django_assert_max_num_queries(30):
+            tasks.run(job)
+        assert job.status == Job.DONE
+
+        recipe = Recipe.objects.get(recipe_id=99998)
+        assert recipe.recipe_ingredients.count() == 15
+        assert Favorite.objects.filter(user=user, recipe=recipe).count() == 1
+
+    def test_add_to_favorite_existing_recipe_skips_upstream(
+        self, client, user, recipe, cocktaildb_client
+    ):
+        client.force_login(user)
+        url = reverse("myApp:add_favorite", kwargs={"pk": recipe.recipe_id})
+
+        client.get(url)
+        response = client.get(url, follow=True)
+
+        assert Favorite.objects.filter(user=user, recipe=recipe).count() == 1
+        assert "You've already added this item before!" in [
+            m.message for m in response.context["messages"]
+        ]
+        assert cocktaildb_client.metrics.snapshot() == {}
+
     def test_delete_favorite(self, client, user, recipe):
         client.force_login(user)
         fav = Favorite.objects.create(user=user, recipe=recipe)
@@ -94,3 +208,96 @@ class TestStandardViews:
         assert "Recipe has been deleted successfully" in [
             m.message for m in list(response.context["messages"])
         ]
+
+
+@pytest.mark.django_db
+class TestFavoritePages:
+
+    def make_favorites(self, user, count):
+        writer = CatalogWriter()
+        pks = writer.write(
+            [
+                Drink(
+                    id=i,
+                    title=f"Drink {i}",
+                    category="Cocktail",
+                    ingredients=(("Gin", "1 oz"), (f"Bitters {i}", "1 dash")),
+                )
+                for i in range(1, count + 1)
+            ]
+        )
+        return [Favorite.objects.create(user=user, recipe_id=pks[i]) for i in pks]
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(queries)
+
+    def test_my_favorites_query_count_is_fixed(self, client, user):
+        client.force_login(user)
+        url = reverse("myApp:my_favorites")
+        self.make_favorites(user, 1)
+        one = self.count_queries(client, url)
+
+        Favorite.objects.all().delete()
+        self.make_favorites(user, 8)
+
+        assert self.count_queries(client, url) == one
+
+    def test_my_favorites_keyset_pagination(self, client, user):
+        client.force_login(user)
+        favorites = self.make_favorites(user, views.FAVORITES_PAGE_SIZE + 5)
+        url = reverse("myApp:my_favorites")
+
+        first = client.get(url).context
+        second = client.get(url, {"cursor": first["next_cursor"]}).context
+
+        # Newest first, no overlap, nothing left out
+        seen = list(first["favorites"]) + list(second["favorites"])
+        assert seen == sorted(favorites, key=lambda f: (f.created_at, f.pk))[::-1]
+        assert second["next_cursor"] is None
+        assert client.get(url, {"cursor": "nope"}).status_code == 400
+
+    def test_favorite_detail_query_count_is_fixed(self, client, user):
+        client.force_login(user)
+        favorite = self.make_favorites(user, 1)[0]
+        url = reverse("myApp:detail_favorite", kwargs={"pk": favorite.pk})
+        Rating.objects.create(recipe_id=favorite.recipe_id, user=user, rate=4)
+        # Builds the similar drinks index
+        client.get(url)
+        one = self.count_queries(client, url)
+
+        for i in range(5):
+            other = User.objects.create_user(username=f"rater{i}")
+            Rating.objects.create(recipe_id=favorite.recipe_id, user=other, rate=3)
+
+        assert self.count_queries(client, url) == one
+
+    def test_pages_answer_not_modified_until_changed(
+        self, client, user, django_capture_on_commit_callbacks
+    ):
+        client.force_login(user)
+        favorite = self.make_favorites(user, 2)[0]
+        urls = [
+            reverse("myApp:my_favorites"),
+            reverse("myApp:detail_favorite", kwargs={"pk": favorite.pk}),
+        ]
+        pages = [client.get(url) for url in urls]
+        for url, page in zip(urls, pages):
+            response = client.get(url, HTTP_IF_NONE_MATCH=page["ETag"])
+            assert response.status_code == 304
+            assert "private" in response["Cache-Control"]
+
+        Rating.objects.create(recipe_id=favorite.recipe_id, user=user, rate=4)
+        for url, page in zip(urls, pages):
+            assert client.get(url, HTTP_IF_NONE_MATCH=page["ETag"]).status_code == 200
+
+        # Removing a favorite and its flash message
+        pages = [client.get(url) for url in urls]
+        with django_capture_on_commit_callbacks(execute=True):
+            client.get(reverse("myApp:delete_favorite", kwargs={"pk": favorite.pk}))
+        response = client.get(urls[0], HTTP_IF_NONE_MATCH=pages[0]["ETag"])
+        assert response.status_code == 200
+        assert "deleted successfully" in response.content.decode()
+        assert client.get(urls[1]).status_code == 404
@@ -0,0 +1,188 @@
+import bisect
+import heapq
+
+from django.db.models import Count, Subquery
+
+from .indexes import CatalogIndex
+from .models import Ingredient, Recipe, RecipeIngredient
+from .search import TOKEN_RE, fold
+
+# Completions kept per prefix, the most a lookup can return
+MAX_LIMIT = 20
+
+# Completions of prefixes matching more keys than this are computed when the
+# index is built, the others take a few dozen microseconds on demand
+PRECOMPUTED_MATCHES = 256
+
+# Cached prefixes at most, the cache is emptied when full
+CACHE_SIZE = 10000
+
+LOAD_CHUNK_SIZE = 500
+
+
+def normalize(text):
+    return " ".join(TOKEN_RE.findall(fold(text)))
+
+
+class PrefixArray:
+    """Names sorted by their lookup keys, the folded name from the start of
+    each of its words, so "mar" completes both "Margarita" and "Frozen
+    Margarita". The top MAX_LIMIT completions of a prefix are cached until a
+    name under that prefix changes.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.names = {}
+        self.cache = {}
+
+    def _entries(self, item_id, name, popularity):
+        words = normalize(name).split()
+        # Names starting with the prefix come first, then the popular ones,
+        # then the short ones
+        return [
+            (" ".join(words[start:]), (start > 0, -popularity, len(name), item_id))
+            for start in range(len(words))
+        ]
+
+    def load(self, items):
+        for item_id, name, popularity in items:
+            entries = self._entries(item_id, name, popularity)
+            self.entries.extend(entries)
+            self.names[item_id] = (name, entries)
+        self.entries.sort()
+        self.cache.clear()
+        self._precompute("")
+
+    def _range(self, prefix, start=0):
+        start = bisect.bisect_left(self.entries, (prefix,), start)
+        end = bisect.bisect_left(self.entries, (prefix + "\U0010ffff",), start)
+        return start, end
+
+    def _precompute(self, prefix):
+        start, end = self._range(prefix)
+        if end - start <= PRECOMPUTED_MATCHES:
+            return
+        if prefix:
+            self.complete(prefix)
+        # Walk down to the longer prefixes, one per distinct next character
+        position = start
+        while position < end:
+            key = self.entries[position][0]
+            if len(key) == len(prefix):
+                position += 1
+                continue
+            longer = key[: len(prefix) + 1]
+            self._precompute(longer)
+            position = self._range(longer, position)[1]
+
+    def add(self, item_id, name, popularity):
+        self.remove(item_id)
+        entries = self._entries(item_id, name, popularity)
+        for entry in entries:
+            bisect.insort(self.entries, entry)
+            self._invalidate(entry[0])
+        self.names[item_id] = (name, entries)
+
+    def remove(self, item_id):
+        _, entries = self.names.pop(item_id, (None, ()))
+        for entry in entries:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+            self._invalidate(entry[0])
+
+    def _invalidate(self, key):
+        for length in range(1, len(key) + 1):
+            self.cache.pop(key[:length], None)
+
+    def complete(self, prefix):
+        """Ids of the best MAX_LIMIT names with a key starting with `prefix`."""
+        completions = self.cache.get(prefix)
+        if completions is None:
+            start, end = self._range(prefix)
+            best = {}
+            for position in range(start, end):
+                rank = self.entries[position][1]
+                item_id = rank[-1]
+                if item_id not in best or rank < best[item_id]:
+                    best[item_id] = rank
+            completions = [
+                rank[-1] for rank in heapq.nsmallest(MAX_LIMIT, best.values())
+            ]
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            self.cache[prefix] = completions
+        return completions
+
+
+class TypeaheadIndex(CatalogIndex):
+    """Completions of recipe titles and ingredient names.
+
+    Recipes are ranked by number of favorites and ingredients by number of
+    recipes, as of the last time they were loaded.
+    """
+
+    def clear(self):
+        self.recipes = PrefixArray()
+        self.ingredients = PrefixArray()
+
+    def build(self):
+        self.recipes.load(
+            Recipe.objects.annotate(popularity=Count("favorites")).values_list(
+                "pk", "title", "popularity"
+            )
+        )
+        self.ingredients.load(
+            Ingredient.objects.annotate(
+                popularity=Count("recipeingredient")
+            ).values_list("pk", "name", "popularity")
+        )
+
+    def update(self, recipe_pks):
+        recipe_pks = list(recipe_pks)
+        for start in range(0, len(recipe_pks), LOAD_CHUNK_SIZE):
+            chunk = recipe_pks[start : start + LOAD_CHUNK_SIZE]
+            rows = (
+                Recipe.objects.filter(pk__in=chunk)
+                .annotate(popularity=Count("favorites"))
+                .values_list("pk", "title", "popularity")
+            )
+            found = set()
+            for pk, title, popularity in rows:
+                self.recipes.add(pk, title, popularity)
+                found.add(pk)
+            for pk in set(chunk) - found:
+                self.recipes.remove(pk)
+
+            ingredient_ids = RecipeIngredient.objects.filter(
+                recipe_id__in=chunk
+            ).values("ingredient_id")
+            rows = (
+                Ingredient.objects.filter(pk__in=Subquery(ingredient_ids))
+                .annotate(popularity=Count("recipeingredient"))
+                .values_list("pk", "name", "popularity")
+            )
+            for row in rows:
+                self.ingredients.add(*row)
+
+    def complete(self, query, limit=8):
+        """Return the best (id, name) completions of `query` as
+        {"recipes": [...], "ingredients": [...]}."""
+        prefix = normalize(query)
+        limit = min(limit, MAX_LIMIT)
+        if not prefix or limit <= 0:
+            return {"recipes": [], "ingredients": []}
+        self.ensure_fresh()
+        with self._lock:
+            return {
+                kind: [
+                    (item_id, names.names[item_id][0])
+                    for item_id in names.complete(prefix)[:limit]
+                ]
+                for kind, names in (
+                    ("recipes", self.recipes),
+                    ("ingredients", self.ingredients),
+                )
+            }
+
+
+index = TypeaheadIndex()
@@ -0,0 +1,117 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Time of the last change to a user's favorites. Recipes carry their own
+# version, Recipe.updated_at.
+FAVORITES_VERSION_KEY = "version:favorites:{}"
+
+
+def favorites_version(user_id):
+    """Timestamp of the last change to the user's favorites, 0 for
+    anonymous users.
+
+    A version lost from the cache starts again from now, which only costs
+    clients one full response.
+    """
+    if user_id is None:
+        return 0
+    key = FAVORITES_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        cache.add(key, version, None)
+    return version
+
+
+def bump_favorites_version(user_id):
+    key = FAVORITES_VERSION_KEY.format(user_id)
+    transaction.on_commit(lambda: cache.set(key, time.time(), None))
+
+
+def make_etag(request, versions):
+    """Strong ETag of a response built from data at `versions`.
+
+    The same URL answers differently depending on the user and the format
+    negotiated from Accept, both are part of the tag.
+    """
+    parts = [
+        request.get_full_path(),
+        request.META.get("HTTP_ACCEPT", ""),
+        request.user.pk,
+        *versions,
+    ]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def csrf_secret(request):
+    """Version of the CSRF tokens embedded in HTML pages, the secret
+    rotated at login."""
+    get_token(request)
+    return request.META["CSRF_COOKIE"]
+
+
+def latest(*stamps):
+    """The most recent of datetimes and time.time() timestamps."""
+    stamps = [
+        (
+            stamp
+            if isinstance(stamp, datetime)
+            else datetime.fromtimestamp(stamp, timezone.utc)
+        )
+        for stamp in stamps
+        if stamp
+    ]
+    return max(stamps, default=None)
+
+
+def respond(request, versions, last_modified, render):
+    """Answer 304 if the client has the response built from data at
+    `versions`, or call render() for it.
+
+    The validators make the client revalidate every time (no-cache), the
+    work saved is that of building and sending an unchanged response.
+    """
+    etag = quote_etag(make_etag(request, versions))
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag, timestamp)
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_date(timestamp)
+        patch_cache_control(
+            response, no_cache=True, private=request.user.is_authenticated
+        )
+    return response
+
+
+def conditional(get_versions):
+    """Decorate a view with respond(), fed by get_versions(request, *args,
+    **kwargs) returning (versions, last modified), or None to skip
+    conditional handling."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Flash messages would be lost with a 304
+            if len(messages.get_messages(request)):
+                found = None
+            else:
+                found = get_versions(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            return respond(request, *found, lambda: view(request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -1,12 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import generic
-import requests
 from django.contrib import messages
-from django.core.cache import cache
-
-from .models import RecipeIngredient, Category, Recipe, Ingredient, Favorite, Rating
+from django.db.models import Max, Prefetch
+from django.utils.decorators import method_decorator
+
+from . import drink_pool, pantry, tasks
+from .caching import single_flight
+from .cocktaildb import CocktailDBError, get_client
+from .drinks import Drink
+from .ingest import add_favorite
+from .models import Recipe, Favorite, Rating
 from .forms import RatingForm
+from .pagination import keyset_page
+from .search import search_recipes
+from .signals import catalog_state
+from .versions import conditional, csrf_secret, favorites_version, latest
 
 
 # Create your views here.
@@ -16,23 +25,11 @@ class IndexView(generic.TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Look for 'random_drink' in the cache
-        drink = cache.get("random_drink")
-
-        if not drink:
-            try:
-                response = requests.get(
-                    "https://www.thecocktaildb.com/api/json/v1/1/random.php"
-                )
-                response.raise_for_status()
-                data = response.json()
-                drink = data["drinks"][0]
-
-                # Store it for 5 minutes (300 seconds)
-                cache.set("random_drink", drink, 300)
-            except Exception:
-                messages.warning(self.request, "Check your internet connection.")
-                drink = None
+        # Picked from the pool refilled in the background, the page never
+        # waits on TheCocktailDB
+        drink = drink_pool.pick()
+        if drink is None:
+            messages.warning(self.request, "Check your internet connection.")
 
         context["drink"] = drink
         return context
@@ -45,109 +42,95 @@ class SearchView(generic.TemplateView):
         query = request.GET.get("query")
         drinks = None
 
+        # Our own catalog answers first, TheCocktailDB only for what we lack
         if query:
+            drinks = [Drink.from_recipe(r) for r in search_recipes(query)] or None
+
+        if query and not drinks:
             # Create a unique key for every search term
             cache_key = f"search_res_{query.lower().strip()}"
-            drinks = cache.get(cache_key)
 
-            if not drinks:
-                url = (
-                    f"https://www.thecocktaildb.com/api/json/v1/1/search.php?s={query}"
+            try:
+                # Cache successful search results for 1 hour, and serve them
+                # for another day while refreshing or if the API is down
+                drinks = single_flight(
+                    cache_key,
+                    lambda: get_client().search(query) or None,
+                    3600,
+                    stale_timeout=60 * 60 * 24,
                 )
-                try:
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    drinks = response.json().get("drinks")
-
-                    if drinks:
-                        # Cache successful search results for 1 hour
-                        cache.set(cache_key, drinks, 3600)
-                    else:
-                        drinks = {"error": "No drinks found!"}
-                except Exception:
-                    drinks = {"error": "API Error!"}
+                if not drinks:
+                    drinks = {"error": "No drinks found!"}
+            except CocktailDBError:
+                drinks = {"error": "API Error!"}
 
         return render(request, self.template_name, {"query": query, "drinks": drinks})
 
 
 def add_to_favorite(request, pk):
-    url = f"https://www.thecocktaildb.com/api/json/v1/1/lookup.php?i={pk}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        drink = response.json()["drinks"][0]
-        if not drink:  # Handle case where no drinks are found
-            drink = {"error": "No drinks found for this search!"}
-    except:  # noqa
-        drink = {"error": "An Error happened!!! Try Another Time!"}
-
-    if drink:
-        if Recipe.objects.filter(recipe_id=drink["idDrink"]).exists():
-            print("we've already had this item in the database.")
-            recipe = get_object_or_404(Recipe, recipe_id=drink["idDrink"])
-            if Favorite.objects.filter(user=request.user, recipe=recipe).exists():
-                messages.warning(request, "You've already added this item before!")
-                return redirect("myApp:my_favorites")
-
-            Favorite.objects.create(user=request.user, recipe=recipe)
-            messages.success(request, "Recipe has been added successfully")
-            return redirect("myApp:my_favorites")
-
-        else:
-            print("we don't have this drink in the database and we should add it.")
-            # First we get or create the category
-            drink_category, _ = Category.objects.get_or_create(
-                name=drink["strCategory"]
-            )
-
-            # Then add the recipe
-            recipe = Recipe.objects.create(
-                recipe_id=drink["idDrink"],
-                title=drink["strDrink"],
-                instructions=drink["strInstructions"],
-                category=drink_category,
-                picture_url=drink["strDrinkThumb"],
-            )
-
-            # then the ingredients and amounts through RecipeIngredient Model
-            # first we get the ingredients, amounts and orders
-            ingredients_list = []
-            amounts_list = []
-            order_list = []
-            for number in range(1, 16):
-                if (
-                    drink[f"strMeasure{number}"] is None
-                    or drink[f"strIngredient{number}"] is None
-                ):
-                    break
-                else:
-                    ingredients_list.append(drink[f"strIngredient{number}"])
-                    amounts_list.append(drink[f"strMeasure{number}"])
-                    order_list.append(number)
-
-            # Then we add them in the database through RecipeIngredient Model
-            for index in range(len(amounts_list)):
-                # get or create the ingredient
-                ingredient, _ = Ingredient.objects.get_or_create(
-                    name=ingredients_list[index]
-                )
-                # record the recipeIngredient
-                RecipeIngredient.objects.create(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    amount=amounts_list[index],
-                    order=order_list[index],
-                )
+    # Drinks we already have don't need the API, sync_catalog refreshes them
+    recipe_pk = Recipe.objects.filter(recipe_id=pk).values_list("pk", flat=True).first()
+    if recipe_pk is None:
+        # The lookup and ingest run in the task worker, the request doesn't
+        # wait on TheCocktailDB
+        tasks.enqueue(
+            "favorite_drink",
+            key=f"favorite_drink:{request.user.pk}:{pk}",
+            user_id=request.user.pk,
+            drink_id=pk,
+        )
+        messages.success(request, "Recipe will be added to your favorites shortly")
+        return redirect("myApp:my_favorites")
 
-            # add it to user's favorite
-            Favorite.objects.create(user=request.user, recipe=recipe)
-    messages.success(request, "Recipe has been added successfully")
+    _, created = add_favorite(request.user, recipe_pk)
+    if created:
+        tasks.enqueue(
+            "update_recommendations",
+            key=f"update_recommendations:{recipe_pk}",
+            recipe_pk=recipe_pk,
+        )
+        messages.success(request, "Recipe has been added successfully")
+    else:
+        messages.warning(request, "You've already added this item before!")
     return redirect("myApp:my_favorites")
 
 
+FAVORITES_PAGE_SIZE = 20
+
+
+def favorites_with_recipes():
+    # Everything the favorite templates show, in a fixed number of queries
+    return Favorite.objects.select_related("recipe__category").prefetch_related(
+        "recipe__recipe_ingredients__ingredient"
+    )
+
+
+def my_favorites_versions(request):
+    if not request.user.is_authenticated:
+        return None
+    favorites = favorites_version(request.user.pk)
+    updated_at = Recipe.objects.filter(favorites__user=request.user).aggregate(
+        Max("updated_at")
+    )["updated_at__max"]
+    return [favorites, updated_at, csrf_secret(request)], latest(favorites, updated_at)
+
+
+@conditional(my_favorites_versions)
 def my_favorites(request):
-    favorite_list = Favorite.objects.filter(user=request.user)
-    return render(request, "myApp/my_favorites.html", {"favorites": favorite_list})
+    favorite_list, next_cursor = keyset_page(
+        favorites_with_recipes().filter(user=request.user),
+        request.GET.get("cursor"),
+        FAVORITES_PAGE_SIZE,
+    )
+    return render(
+        request,
+        "myApp/my_favorites.html",
+        {
+            "favorites": favorite_list,
+            "next_cursor": next_cursor,
+            "is_first_page": not request.GET.get("cursor"),
+        },
+    )
 
 
 def delete_favorite(request, pk):
@@ -165,23 +148,23 @@ class RatingFormView(generic.FormView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        pk = self.kwargs.get("pk")
-        print(pk)
-        context["recipe"] = get_object_or_404(Recipe, pk=pk)
-        print(context["recipe"])
+        context["recipe"] = get_object_or_404(Recipe, pk=self.kwargs.get("pk"))
         return context
 
     def form_valid(self, form):
-        pk = self.kwargs.get("pk")
-        print(pk)
-
-        recipe = get_object_or_404(Recipe, pk=pk)
-        # Update if exists, or create a new entry
+        recipe = get_object_or_404(Recipe, pk=self.kwargs.get("pk"))
+        # Update if exists, or create a new entry. The rating stats follow in
+        # the same UPDATE (myApp/signals.py), the recommendations later
         rating, created = Rating.objects.update_or_create(
             recipe=recipe,
             user=self.request.user,
             defaults={"rate": form.cleaned_data["rate"]},
         )
+        tasks.enqueue(
+            "update_recommendations",
+            key=f"update_recommendations:{recipe.pk}",
+            recipe_pk=recipe.pk,
+        )
         if created:
             messages.success(self.request, "Rating added successfully!")
         else:
@@ -189,6 +172,37 @@ class RatingFormView(generic.FormView):
         return redirect("myApp:my_favorites")
 
 
+def favorite_versions(request, pk):
+    found = (
+        Favorite.objects.filter(pk=pk).values_list("recipe__updated_at", "user").first()
+    )
+    if found is None:
+        # Answered with a 404 by the view
+        return None
+    updated_at, user_id = found
+    favorites = favorites_version(user_id)
+    # The similar drinks panel follows the other recipes
+    versions = [updated_at, favorites, catalog_state(), csrf_secret(request)]
+    return versions, latest(updated_at, favorites)
+
+
+@method_decorator(conditional(favorite_versions), name="get")
 class MyFavoriteDetailView(generic.DetailView):
     model = Favorite
     template_name = "myApp/detail_favorite.html"
+
+    def get_queryset(self):
+        return favorites_with_recipes().prefetch_related(
+            Prefetch("recipe__ratings", Rating.objects.select_related("user"))
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        scored = pantry.index.similar(self.object.recipe_id, pantry.SIMILAR_DRINKS)
+        recipes = Recipe.objects.only("recipe_id", "title", "picture_url").in_bulk(
+            [pk for pk, _ in scored]
+        )
+        context["similar_drinks"] = [
+            (recipes[pk], score) for pk, score in scored if pk in recipes
+        ]
+        return context